@@ -0,0 +1,69 @@
+import argparse
+import os
+import time
+import numpy as np
+from filters.agf import AGF
+from sim.batch import BatchSim
+from sim.core import DT
+
+# AGF multi-core scaling benchmark
+#
+# Times predict, update and estimate of the exact-mode grid filter on the
+# same recorded controls and measurements, first with the single-threaded
+# njit kernels and then with the prange kernels at each thread count, for
+# each grid resolution. Reports milliseconds per step and the speedup over
+# the single-threaded kernels.
+
+WIDTH, HEIGHT = 1200, 800
+SENSOR_NOISE  = 30.0
+
+
+def time_agf(resolution, ctrl, obs, beacons, parallel, threads=None, warmup=3):
+    agf = AGF(WIDTH, HEIGHT, resolution, [700, 250], parallel=parallel, num_threads=threads)
+    stages = np.zeros(3)
+    for k in range(len(ctrl)):
+        t0 = time.perf_counter()
+        agf.predict(ctrl[k, :2], DT)
+        t1 = time.perf_counter()
+        agf.update(obs[k], beacons, SENSOR_NOISE)
+        t2 = time.perf_counter()
+        agf.get_estimated_state()
+        t3 = time.perf_counter()
+        # the first steps include JIT compilation / cache loading
+        if k >= warmup:
+            stages += (t1 - t0, t2 - t1, t3 - t2)
+    return stages / (len(ctrl) - warmup) * 1e3
+
+
+if __name__ == "__main__":
+    import numba
+
+    parser = argparse.ArgumentParser(description="AGF kernel scaling across threads and resolutions")
+    parser.add_argument("--resolutions", default="20,15,10", help="cell sizes in px")
+    parser.add_argument("--threads", default=None,
+                        help="comma-separated thread counts (default: powers of two up to all cores)")
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    max_threads = numba.config.NUMBA_NUM_THREADS
+    if args.threads is None:
+        threads = sorted({min(2 ** i, max_threads) for i in range(max_threads.bit_length() + 1)})
+    else:
+        threads = [int(t) for t in args.threads.split(",")]
+
+    sim = BatchSim(1, WIDTH, HEIGHT, seed=args.seed)
+    obs, ctrl, _ = sim.rollout(args.steps, SENSOR_NOISE, DT)
+    obs, ctrl = obs[0], ctrl[0]
+
+    print(f"{os.cpu_count()} cores, numba threads available: {max_threads}")
+    print(f"{'res':>4}{'cells':>8}{'kernels':>10}{'predict ms':>12}{'update ms':>11}"
+          f"{'estimate ms':>13}{'speedup':>9}")
+    for res in (int(r) for r in args.resolutions.split(",")):
+        cells = (WIDTH // res) * (HEIGHT // res)
+        base = time_agf(res, ctrl, obs, sim.beacons, parallel=False)
+        rows = [("serial", base)] + [(f"{t} thr", time_agf(res, ctrl, obs, sim.beacons, True, t))
+                                      for t in threads]
+        for label, stages in rows:
+            print(f"{res:>4}{cells:>8}{label:>10}{stages[0]:>12.2f}{stages[1]:>11.3f}"
+                  f"{stages[2]:>13.3f}{base.sum() / stages.sum():>8.2f}x")
@@ -1,55 +1,152 @@
+import argparse
+import os
 import numpy as np
-import matplotlib.pyplot as plt
-from main import run_simulation
+from multiprocessing import Pool
+from filters.registry import DEFAULT_FILTERS, get_filter_spec
+from sim.headless import run_headless, run_replay
+from sim.recording import list_trajectories, load_trajectory
+from sim.profiling import FilterProfile
 
 N_RUNS    = 100
 SEED_BASE = 42
+T         = 300
 
-ekf_rmse_list  = []
-pf_rmse_list   = []
-agf_rmse_list  = []
-asir_rmse_list = []
 
-print(f"Running {N_RUNS} simulations...")
+def _run_seed(job):
+    # each run reseeds from its own seed, so the result does not depend on
+    # which worker picks it up or in what order
+    i, seed, T, options, replay_path = job
+    # the profile is histograms and counters only, so it pickles cheaply
+    if replay_path is not None:
+        return (i, *run_replay(load_trajectory(replay_path), seed, return_profile=True, **options))
+    return (i, *run_headless(T, seed, return_profile=True, **options))
 
-for i in range(N_RUNS):
-    seed = SEED_BASE + i
-    rmse_ekf, rmse_pf, rmse_agf, rmse_asir, _ = run_simulation(False, 300, seed)
 
-    ekf_rmse_list.append(rmse_ekf)
-    pf_rmse_list.append(rmse_pf)
-    agf_rmse_list.append(rmse_agf)
-    asir_rmse_list.append(rmse_asir)
+def run_benchmark(n_runs=N_RUNS, seed_base=SEED_BASE, T=T, workers=None,
+                  filters=DEFAULT_FILTERS, return_profile=False, record_dir=None,
+                  replay_dir=None, **options):
+    """Run n_runs seeded simulations over a process pool.
+
+    Per-run results are printed as they finish and collected by run index,
+    so the returned (n_runs, len(filters)) RMSE array is identical for any
+    number of workers. workers=1 runs in-process. Extra keyword options are
+    passed to run_headless. With return_profile=True also returns the
+    latency/memory FilterProfile merged over all runs.
+
+    record_dir writes every simulated run there (sim/recording.py);
+    replay_dir instead replays the runs recorded there, one per run index,
+    with n_runs capped at the number found.
+    """
+    filters = tuple(filters)
+    for name in filters:
+        get_filter_spec(name)  # fail fast on a typo, before starting workers
+    workers = os.cpu_count() if workers is None else workers
+    options = dict(options, filters=filters)
+    replay_paths = [None] * n_runs
+    if replay_dir is not None:
+        replay_paths = list_trajectories(replay_dir)[:n_runs]
+        n_runs = len(replay_paths)
+    jobs = []
+    for i in range(n_runs):
+        run_options = options
+        if record_dir is not None and replay_dir is None:
+            run_options = dict(options, record_to=os.path.join(record_dir, f"seed_{seed_base + i:06d}"))
+        jobs.append((i, seed_base + i, T, run_options, replay_paths[i]))
+    results = np.empty((n_runs, len(filters)))
+    profile = FilterProfile(filters)
+
+    def record(done, i, rmse, run_profile):
+        results[i] = [rmse[name] for name in filters]
+        profile.merge(run_profile)
+        row = "  ".join(f"{name.upper()}: {rmse[name]:.1f}" for name in filters)
+        print(f"[{done:3d}/{n_runs}] seed {seed_base + i}  {row}", flush=True)
+
+    if workers <= 1:
+        for done, job in enumerate(jobs, 1):
+            record(done, *_run_seed(job))
+    else:
+        with Pool(workers) as pool:
+            for done, out in enumerate(pool.imap_unordered(_run_seed, jobs), 1):
+                record(done, *out)
+
+    if return_profile:
+        return results, profile
+    return results
 
-    print(f"[{i+1:3d}/{N_RUNS}]  EKF: {rmse_ekf:.1f}  PF: {rmse_pf:.1f}  "
-          f"AGF: {rmse_agf:.1f}  ASIR: {rmse_asir:.1f}")
 
 def summary_stats(name, data):
-    print(f"\n{name} RMSE over {N_RUNS} runs:")
+    print(f"\n{name} RMSE over {len(data)} runs:")
     print(f"  Mean   : {np.mean(data):.2f}")
     print(f"  Std    : {np.std(data):.2f}")
     print(f"  Median : {np.median(data):.2f}")
     print(f"  Min    : {np.min(data):.2f}  Max: {np.max(data):.2f}")
 
-print("\n" + "="*55)
-summary_stats("EKF",  ekf_rmse_list)
-summary_stats("PF",   pf_rmse_list)
-summary_stats("AGF",  agf_rmse_list)
-summary_stats("ASIR", asir_rmse_list)
-
-plt.figure(figsize=(8, 5))
-plt.boxplot(
-    [ekf_rmse_list, pf_rmse_list, agf_rmse_list, asir_rmse_list],
-    labels=["EKF", "PF (SIR)", "AGF", "ASIR"],
-    patch_artist=True,
-    boxprops=dict(facecolor="#2a2a3a", color="gray"),
-    medianprops=dict(color="white", linewidth=2),
-    whiskerprops=dict(color="gray"),
-    capprops=dict(color="gray"),
-    flierprops=dict(marker="o", color="gray", alpha=0.5),
-)
-plt.ylabel("RMSE (px)")
-plt.title(f"Filter RMSE comparison — {N_RUNS} runs")
-plt.grid(True, alpha=0.3)
-plt.tight_layout()
-plt.show()
+
+def plot_results(results, filters):
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(8, 5))
+    plt.boxplot(
+        [results[:, j] for j in range(len(filters))],
+        labels=[name.upper() for name in filters],
+        patch_artist=True,
+        boxprops=dict(facecolor="#2a2a3a", color="gray"),
+        medianprops=dict(color="white", linewidth=2),
+        whiskerprops=dict(color="gray"),
+        capprops=dict(color="gray"),
+        flierprops=dict(marker="o", color="gray", alpha=0.5),
+    )
+    plt.ylabel("RMSE (px)")
+    plt.title(f"Filter RMSE comparison — {len(results)} runs")
+    plt.grid(True, alpha=0.3)
+    plt.tight_layout()
+    plt.show()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte-Carlo filter benchmark")
+    parser.add_argument("--runs", type=int, default=N_RUNS)
+    parser.add_argument("--seed-base", type=int, default=SEED_BASE)
+    parser.add_argument("--steps", type=int, default=T)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: all cores, 1 = in-process)")
+    parser.add_argument("--filters", default=",".join(DEFAULT_FILTERS),
+                        help="comma-separated registry names, e.g. pf,asir,upf")
+    parser.add_argument("--map-aware", action="store_true",
+                        help="give the particle and grid filters the wall map")
+    parser.add_argument("--grid-threads", type=int, default=None, metavar="N",
+                        help="run the AGF kernels multi-threaded on N threads per worker "
+                             "(keep workers * N <= cores)")
+    parser.add_argument("--float32", action="store_true",
+                        help="store grid and particle state in float32")
+    parser.add_argument("--track-memory", action="store_true",
+                        help="record per-filter peak allocation per step (slower)")
+    parser.add_argument("--profile-filter", default=None,
+                        help="wrap one filter in cProfile (report from the first finished run)")
+    parser.add_argument("--record", default=None, metavar="DIR",
+                        help="write each simulated run to DIR for later replay")
+    parser.add_argument("--replay", default=None, metavar="DIR",
+                        help="replay the runs recorded in DIR instead of simulating")
+    parser.add_argument("--no-plot", action="store_true")
+    args = parser.parse_args()
+    filters = tuple(args.filters.split(","))
+
+    print(f"Running {args.runs} simulations...")
+    results, profile = run_benchmark(args.runs, args.seed_base, args.steps, args.workers,
+                                     filters=filters, return_profile=True, map_aware=args.map_aware,
+                                     grid_parallel=args.grid_threads is not None,
+                                     grid_threads=args.grid_threads,
+                                     dtype=np.float32 if args.float32 else np.float64,
+                                     track_memory=args.track_memory,
+                                     profile_filter=args.profile_filter,
+                                     record_dir=args.record, replay_dir=args.replay)
+
+    print("\n" + "="*55)
+    for j, name in enumerate(filters):
+        summary_stats(name.upper(), results[:, j])
+
+    print(f"\nLatency over {args.runs} runs:")
+    print(profile.report())
+
+    if not args.no_plot:
+        plot_results(results, filters)
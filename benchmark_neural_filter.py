@@ -0,0 +1,67 @@
+import argparse
+import os
+import time
+import numpy as np
+from filters.neural_filter import MODEL_VARIANTS, NeuralFilter
+from sim.batch import BatchSim
+from sim.core import DT
+from sim.harness import compute_rmse
+from sim.profiling import LatencyHistogram
+
+# Neural filter inference benchmark
+#
+# Steps each exported NeuralFilter variant (eager, TorchScript, dynamic int8,
+# ONNX Runtime) one measurement at a time over the same BatchSim
+# trajectories, as the simulation loop does, and reports per-step latency
+# percentiles, RMSE against ground truth, and the size of the model file.
+
+WIDTH, HEIGHT = 1200, 800
+SENSOR_NOISE  = 30.0
+
+
+def benchmark_variant(variant, obs, ctrl, pos):
+    nf = NeuralFilter(WIDTH, HEIGHT, variant=variant)
+    if not nf.ready:
+        return None
+    latency = LatencyHistogram()
+    errors = []
+    for b in range(len(pos)):
+        nf._hidden = None  # fresh run per trajectory
+        for k in range(pos.shape[1]):
+            start = time.perf_counter()
+            nf.predict(ctrl[b, k, :2], ctrl[b, k, 2])
+            nf.update(obs[b, k], None, SENSOR_NOISE)
+            estimate = nf.get_estimated_state()
+            latency.add(time.perf_counter() - start)
+            errors.append(np.linalg.norm(pos[b, k] - estimate))
+    return latency.summary(), compute_rmse(errors)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NeuralFilter inference variants")
+    parser.add_argument("--runs", type=int, default=20, help="trajectories")
+    parser.add_argument("--steps", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--threads", type=int, default=1, help="torch intra-op threads")
+    parser.add_argument("--variants", default=",".join(MODEL_VARIANTS))
+    args = parser.parse_args()
+
+    try:
+        import torch
+        torch.set_num_threads(args.threads)
+    except ImportError:
+        pass
+
+    obs, ctrl, pos = BatchSim(args.runs, WIDTH, HEIGHT, seed=args.seed).rollout(args.steps, SENSOR_NOISE, DT)
+
+    print(f"{args.runs} trajectories x {args.steps} steps, {args.threads} thread(s)\n")
+    print(f"{'variant':<12}{'p50 us':>9}{'p95 us':>9}{'p99 us':>9}{'max us':>9}"
+          f"{'RMSE px':>10}{'size KiB':>10}")
+    for variant in args.variants.split(","):
+        out = benchmark_variant(variant, obs, ctrl, pos)
+        if out is None:
+            continue
+        s, rmse = out
+        size = os.path.getsize(MODEL_VARIANTS[variant]) / 1024
+        print(f"{variant:<12}{s['p50'] * 1e6:>9.1f}{s['p95'] * 1e6:>9.1f}{s['p99'] * 1e6:>9.1f}"
+              f"{s['max'] * 1e6:>9.1f}{rmse:>10.2f}{size:>10.0f}")
@@ -1,115 +1,282 @@
 import numpy as np
-from scipy.stats import beta
-from numba import njit
-
-# use numba speed up because of high computational load of grid based filter. 
-
-@njit
-def compute_prior(curr_x, curr_y, flow_x, flow_y, mu_x, mu_y, dt, sigma=15, alpha=0.75):
-    expected_x = flow_x + alpha * mu_x * dt
-    expected_y = flow_y + alpha * mu_y * dt
-    dx = curr_x - expected_x
-    dy = curr_y - expected_y
-    dist_squared = dx**2 + dy**2
-    coeff = 1.0 / (2 * np.pi * sigma**2)
-    exponent = -dist_squared / (2 * sigma**2)
-    return coeff * np.exp(exponent)
-
-@njit
-def estimate_jit(weights, centers):
-    grid_height, grid_width = weights.shape
-    weighted_avg_X = 0
-    weighted_avg_Y = 0
-    for i in range(grid_height):
-        for j in range(grid_width):
-            curr_x, curr_y = centers[i, j]
-            weighted_avg_X += weights[i][j] * curr_x
-            weighted_avg_Y += weights[i][j] * curr_y
-    return [weighted_avg_X, weighted_avg_Y]
-
-@njit
-def predict_jit(weights, centers, mu, dt, res):
-    grid_height, grid_width = weights.shape
-    new_weights = np.zeros_like(weights)
-    mu_x, mu_y = mu
-    motion_magnitude = (mu_x**2 + mu_y**2)**0.5
-    motion_radius = int(motion_magnitude * dt / res) + 3
-
-    sum = 0
-
-    for i in range(grid_height):
-        for j in range(grid_width):
-            curr_x, curr_y = centers[i, j]
-            total_flow = 0.0
-            for di in range(-motion_radius, motion_radius + 1):
-                for dj in range(-motion_radius, motion_radius + 1):
-                    k = i + di
-                    l = j + dj
-                    if 0 <= k < grid_height and 0 <= l < grid_width:
-                        flow_x, flow_y = centers[k, l]
-                        weight = weights[k, l]
-                        prior = compute_prior(curr_x, curr_y, flow_x, flow_y, mu_x, mu_y, dt)
-                        total_flow += weight * prior
-            new_weights[i, j] = total_flow
-            sum += new_weights[i, j]
-    return new_weights / sum
+from filters.likelihood import distance_fields, range_log_likelihood_from_distances, LikelihoodTableCache
+
+# The transition density used by compute_prior is a Gaussian centred on
+# flow + alpha * mu * dt, i.e. it depends only on the offset between two cells.
+# The Chapman-Kolmogorov sum is therefore a convolution of the weight grid with a
+# fixed (shifted) Gaussian kernel, and because the 2-D Gaussian factors into
+# x and y terms it can be done as two 1-D passes, O(cells * r), or with an
+# FFT, O(cells * log cells), instead of the O(cells * r^2) window loop in agf_kernels.predict_jit.
+
+def kernel_radius(shift, res, sigma=15):
+    # cells needed to cover the shifted Gaussian out to 3 sigma
+    return int(np.ceil((abs(shift) + 3 * sigma) / res))
+
+def transition_kernel_1d(shift, res, sigma=15, radius=None):
+    # g[t + radius] = N(t * res; shift, sigma^2) for cell offsets t in [-radius, radius]
+    if radius is None:
+        radius = kernel_radius(shift, res, sigma)
+    offsets = np.arange(-radius, radius + 1) * res
+    coeff = 1.0 / (np.sqrt(2 * np.pi) * sigma)
+    return coeff * np.exp(-(offsets - shift)**2 / (2 * sigma**2))
+
+def convolve_axis(weights, kernel, axis):
+    # out[i] = sum_t kernel[t] * weights[i - t] along one axis, zero outside the grid
+    radius = (len(kernel) - 1) // 2
+    n = weights.shape[axis]
+    w = np.moveaxis(weights, axis, 0)
+    out = np.zeros_like(w)
+    for t in range(max(-radius, 1 - n), min(radius, n - 1) + 1):
+        if t >= 0:
+            out[t:] += kernel[t + radius] * w[:n - t]
+        else:
+            out[:n + t] += kernel[t + radius] * w[-t:]
+    return np.moveaxis(out, 0, axis)
+
+def _motion_kernels(mu, dt, res, sigma=15, alpha=0.75, radius=None, dtype=float):
+    # in the grid's dtype, so a float32 grid is convolved in float32
+    gx = transition_kernel_1d(alpha * mu[0] * dt, res, sigma, radius).astype(dtype)
+    gy = transition_kernel_1d(alpha * mu[1] * dt, res, sigma, radius).astype(dtype)
+    return gx, gy
+
+def predict_separable(weights, mu, dt, res, sigma=15, alpha=0.75, radius=None):
+    gx, gy = _motion_kernels(mu, dt, res, sigma, alpha, radius, weights.dtype)
+    new_weights = convolve_axis(convolve_axis(weights, gx, axis=1), gy, axis=0)
+    return new_weights / np.sum(new_weights)
+
+def predict_fft(weights, mu, dt, res, sigma=15, alpha=0.75, radius=None):
+    gx, gy = _motion_kernels(mu, dt, res, sigma, alpha, radius, weights.dtype)
+    from scipy.signal import fftconvolve
+    new_weights = fftconvolve(weights, np.outer(gy, gx), mode="same")
+    # FFT round-off can leave tiny negative values where the grid is empty
+    np.maximum(new_weights, 0.0, out=new_weights)
+    return new_weights / np.sum(new_weights)
+
+PREDICT_MODES = ("exact", "separable", "fft")
 
 class AGF:
-    def __init__(self, WIDTH, HEIGHT, resolution, start_pos):
+    def __init__(self, WIDTH, HEIGHT, resolution, start_pos, predict_mode="exact",
+                 sparse=False, sparse_eps=1e-9, sparse_max_fraction=0.5,
+                 beacon_positions=None, z_quantum=None, map_constraint=None,
+                 parallel=False, num_threads=None, dtype=np.float64):
+        if predict_mode not in PREDICT_MODES:
+            raise ValueError(f"unknown predict_mode {predict_mode!r}; expected one of {PREDICT_MODES}")
+        self.predict_mode = predict_mode
+        # numba is imported only once a grid filter is actually built
+        from filters import agf_kernels
+        self._jit = agf_kernels
+
+        # parallel=True runs the exact predict, the likelihood update and the
+        # estimate as multi-threaded prange kernels on num_threads threads
+        # (default: numba's, i.e. every core)
+        self.parallel = parallel
+        self.num_threads = num_threads
         self.res = resolution
         self.grid_height = HEIGHT // resolution
         self.grid_width = WIDTH // resolution
         self.N_s = self.grid_width * self.grid_height
-        self.centers = np.array([[(j * self.res + self.res / 2, i * self.res + self.res / 2)  # (x, y)
-            for j in range(self.grid_width)]
-            for i in range(self.grid_height)])
+        # cell (i, j) is centred at (xs[j], ys[i]); only the two axes are
+        # stored, the full (H, W, 2) grid is built on demand by `centers`
+        self.xs = (np.arange(self.grid_width) + 0.5) * self.res
+        self.ys = (np.arange(self.grid_height) + 0.5) * self.res
+
+        # storage precision of the weight grid, the distance fields and the
+        # map mask. float32 halves the memory traffic of large grids; the
+        # likelihood update still normalizes through a max-shifted log space,
+        # so small weights flush to zero instead of the grid underflowing.
+        self.dtype = np.dtype(dtype)
+
+        # sparse mode: after convergence nearly all of the mass sits in a small
+        # blob, so predict/update/estimate only run on the bounding box of cells
+        # above sparse_eps (padded by the motion kernel). The box is None while
+        # the posterior is spread over more than sparse_max_fraction of the grid,
+        # in which case the full grid is used.
+        self.sparse = sparse
+        self.sparse_eps = sparse_eps
+        self.sparse_max_fraction = sparse_max_fraction
+        self.active = None  # (i0, i1, j0, j1) bounding every nonzero cell, or None
+
+        # beacons are fixed, so the (H, W, M) distance from every cell centre to
+        # every beacon is computed once (here if the beacons are known, else on
+        # the first update). With z_quantum set, measurements are rounded to
+        # that step and whole per-beacon log-likelihood fields are cached too.
+        self._beacons = None
+        self._dist = None
+        self._lik_tables = LikelihoodTableCache(z_quantum) if z_quantum else None
+        if beacon_positions is not None:
+            self._distance_fields(beacon_positions)
+
+        # optional MapConstraint: cells the agent cannot occupy are held at zero
+        self._free = None
+        if map_constraint is not None:
+            self._free = map_constraint.free_mask((self.grid_height, self.grid_width), self.res).astype(self.dtype)
 
         # intialize weight grid
         start_std = 100
-        self.weights = np.zeros((self.grid_height, self.grid_width))
+        self.weights = np.zeros((self.grid_height, self.grid_width), dtype=self.dtype)
         self.initialize_weights_gaussian(start_pos, start_std)
+        self._apply_map_mask()
+        self._refresh_active()
+
+    @property
+    def centers(self):
+        # (H, W, 2) array of cell centres (x, y), built on request
+        X, Y = np.meshgrid(self.xs, self.ys)
+        return np.stack((X, Y), axis=-1)
+
+    def _axes(self, region):
+        # cell-centre axes (xs, ys) of a (rows, cols) region
+        return self.xs[region[1]], self.ys[region[0]]
 
     def initialize_weights_gaussian(self, start_pos, sigma):
         x0, y0 = start_pos
-        for i in range(self.grid_height):
-            for j in range(self.grid_width):
-                x, y = self.centers[i, j]
-                dx = x - x0
-                dy = y - y0
-                dist_squared = dx**2 + dy**2
-                self.weights[i][j] = np.exp(-dist_squared / (2 * sigma**2))
+        dist_squared = (self.xs[None, :] - x0)**2 + (self.ys[:, None] - y0)**2
+        self.weights[:] = np.exp(-dist_squared / (2 * sigma**2))
         self.weights /= np.sum(self.weights) 
 
+    # ------------------------------------------------------------------
+    # Active region bookkeeping (sparse mode)
+    # ------------------------------------------------------------------
+
+    def _region(self):
+        if self.active is None:
+            return (slice(None), slice(None))
+        i0, i1, j0, j1 = self.active
+        return (slice(i0, i1), slice(j0, j1))
+
+    def _fits(self, box):
+        i0, i1, j0, j1 = box
+        return (i1 - i0) * (j1 - j0) <= self.sparse_max_fraction * self.N_s
+
+    def _refresh_active(self):
+        # shrink the active box to the cells holding more than sparse_eps mass
+        if not self.sparse:
+            return
+        region = self._region()
+        mask = self.weights[region] > self.sparse_eps
+        rows = np.flatnonzero(mask.any(axis=1))
+        cols = np.flatnonzero(mask.any(axis=0))
+        if len(rows) == 0:
+            self.active = None
+            return
+        i_off = region[0].start or 0
+        j_off = region[1].start or 0
+        box = (int(i_off + rows[0]), int(i_off + rows[-1] + 1), int(j_off + cols[0]), int(j_off + cols[-1] + 1))
+        if not self._fits(box):
+            self.active = None
+            return
+
+        # drop the negligible mass outside the box so it bounds every nonzero cell
+        i0, i1, j0, j1 = box
+        kept = self.weights[i0:i1, j0:j1].copy()
+        self.weights[:] = 0.0
+        self.weights[i0:i1, j0:j1] = kept / np.sum(kept)
+        self.active = box
+
+    def _apply_map_mask(self):
+        if self._free is None:
+            return
+        region = self._region()
+        weights = self.weights[region]
+        weights *= self._free[region]
+        total = np.sum(weights)
+        if total > 0:
+            weights /= total
+
+    def _predict_radius(self, mu, dt):
+        # (rows, cols) reach of one prediction step, in cells
+        if self.predict_mode == "exact":
+            r = int((mu[0]**2 + mu[1]**2)**0.5 * dt / self.res) + 3
+            return r, r
+        alpha = 0.75
+        return (kernel_radius(alpha * mu[1] * dt, self.res),
+                kernel_radius(alpha * mu[0] * dt, self.res))
+
+    def _predict_weights(self, weights, region, mu, dt):
+        if self.predict_mode == "separable":
+            return predict_separable(weights, mu, dt, self.res).astype(self.dtype, copy=False)
+        elif self.predict_mode == "fft":
+            return predict_fft(weights, mu, dt, self.res).astype(self.dtype, copy=False)
+        xs, ys = self._axes(region)
+        if self.parallel:
+            self._set_threads()
+            return self._jit.predict_parallel(weights, xs, ys, np.asarray(mu, dtype=float), dt, self.res)
+        return self._jit.predict_jit(weights, xs, ys, mu, dt, self.res)
+
+    def _set_threads(self):
+        # numba's thread count is per calling thread, so set it before each kernel
+        if self.num_threads is not None:
+            import numba
+            numba.set_num_threads(self.num_threads)
+
+    # ------------------------------------------------------------------
+
     def predict(self, mu, dt):
-        self.weights = predict_jit(self.weights, self.centers, mu, dt, self.res)
+        self._predict(mu, dt)
+        self._apply_map_mask()
 
-    def update(self, z_k, beacon_positions, sensor_noise):
-        # Get full (x, y) coordinate grids
-        centers_x = self.centers[:, :, 0]
-        centers_y = self.centers[:, :, 1]
+    def _predict(self, mu, dt):
+        if self.active is None:
+            self.weights = self._predict_weights(self.weights, self._region(), mu, dt)
+            return
+
+        # grow the active box by the motion reach, then convolve only inside it
+        ri, rj = self._predict_radius(mu, dt)
+        i0, i1, j0, j1 = self.active
+        box = (max(i0 - ri, 0), min(i1 + ri, self.grid_height),
+               max(j0 - rj, 0), min(j1 + rj, self.grid_width))
+        if not self._fits(box):
+            self.active = None
+            self.weights = self._predict_weights(self.weights, self._region(), mu, dt)
+            return
 
-        # Start with all likelihoods as 1
-        combined_likelihoods = np.ones_like(self.weights)
+        self.active = box
+        region = self._region()
+        self.weights[region] = self._predict_weights(self.weights[region], region, mu, dt)
 
-        for z_k_i, beacon_pos in zip(z_k, beacon_positions):
-            dx = centers_x - beacon_pos[0]
-            dy = centers_y - beacon_pos[1]
-            dist = np.sqrt(dx**2 + dy**2)
+    def _distance_fields(self, beacon_positions):
+        if self._dist is None or not np.array_equal(self._beacons, beacon_positions):
+            self._beacons = np.array(beacon_positions, dtype=float)
+            self._dist = distance_fields(self._beacons, self.xs, self.ys).astype(self.dtype)
+            if self._lik_tables is not None:
+                self._lik_tables.clear()
+        return self._dist
 
-            error = z_k_i - dist
-            coeff = 1.0 / (np.sqrt(2 * np.pi) * sensor_noise)
-            exponent = - (error ** 2) / (2 * sensor_noise ** 2)
-            likelihoods = coeff * np.exp(exponent)
+    def update(self, z_k, beacon_positions, sensor_noise):
+        region = self._region()
+        dist = self._distance_fields(beacon_positions)
 
-            combined_likelihoods *= likelihoods  # assuming independence
+        if self.parallel and self._lik_tables is None:
+            self._set_threads()
+            if self._jit.update_parallel(self.weights[region], dist[region],
+                                         np.asarray(z_k, dtype=float), float(sensor_noise)):
+                self._refresh_active()
+            else:
+                print("weights messed up, normalizing uniformly")
+                self.weights[:] = 1.0 / self.N_s
+                self.active = None
+            return
 
-        self.weights *= combined_likelihoods
-        total = np.sum(self.weights)
-        if total > 0:
-            self.weights /= total
+        # log-likelihood of every cell, assuming independence across beacons
+        if self._lik_tables is not None:
+            log_lik = sum(self._lik_tables.table(dist, b, z, sensor_noise)[region]
+                          for b, z in enumerate(z_k))
+        else:
+            log_lik = range_log_likelihood_from_distances(dist[region], z_k, sensor_noise)
+
+        # multiply in log space so many beacons / tight noise cannot underflow
+        weights = self.weights[region]
+        with np.errstate(divide="ignore"):
+            log_w = np.log(weights) + log_lik
+        max_log = np.max(log_w)
+        if np.isfinite(max_log):
+            weights[:] = np.exp(log_w - max_log)
+            weights /= np.sum(weights)
+            self._refresh_active()
         else:
             print("weights messed up, normalizing uniformly")
             self.weights[:] = 1.0 / self.N_s
+            self.active = None
     
     def get_grid(self):
         return self.weights
@@ -118,5 +285,9 @@ class AGF:
         return [self.grid_height, self.grid_width]
     
     def get_estimated_state(self):
-        est = estimate_jit(self.weights, self.centers)
+        region = self._region()
+        if self.parallel:
+            self._set_threads()
+            return self._jit.estimate_parallel(self.weights[region], *self._axes(region))
+        est = self._jit.estimate_jit(self.weights[region], *self._axes(region))
         return np.array([est[0], est[1]])
@@ -0,0 +1,153 @@
+from numba import njit, prange
+import numpy as np
+
+# Numba kernels for the grid filter, in their own module so that importing
+# filters.agf (or filters.mragf, which shares its convolution helpers) does
+# not import numba. AGF loads this module when it is constructed, and
+# cache=True keeps the compiled machine code in __pycache__, so only the
+# first run on a machine pays the JIT compile.
+
+@njit(cache=True)
+def compute_prior(curr_x, curr_y, flow_x, flow_y, mu_x, mu_y, dt, sigma=15, alpha=0.75):
+    expected_x = flow_x + alpha * mu_x * dt
+    expected_y = flow_y + alpha * mu_y * dt
+    dx = curr_x - expected_x
+    dy = curr_y - expected_y
+    dist_squared = dx**2 + dy**2
+    coeff = 1.0 / (2 * np.pi * sigma**2)
+    exponent = -dist_squared / (2 * sigma**2)
+    return coeff * np.exp(exponent)
+
+@njit(cache=True)
+def estimate_jit(weights, xs, ys):
+    # cell (i, j) is centred at (xs[j], ys[i])
+    grid_height, grid_width = weights.shape
+    weighted_avg_X = 0.0
+    weighted_avg_Y = 0.0
+    for i in range(grid_height):
+        for j in range(grid_width):
+            weighted_avg_X += weights[i, j] * xs[j]
+            weighted_avg_Y += weights[i, j] * ys[i]
+    return [weighted_avg_X, weighted_avg_Y]
+
+@njit(cache=True)
+def predict_jit(weights, xs, ys, mu, dt, res):
+    grid_height, grid_width = weights.shape
+    new_weights = np.zeros_like(weights)
+    mu_x, mu_y = mu
+    motion_magnitude = (mu_x**2 + mu_y**2)**0.5
+    motion_radius = int(motion_magnitude * dt / res) + 3
+
+    sum = 0.0
+
+    for i in range(grid_height):
+        for j in range(grid_width):
+            curr_x, curr_y = xs[j], ys[i]
+            total_flow = 0.0
+            for di in range(-motion_radius, motion_radius + 1):
+                for dj in range(-motion_radius, motion_radius + 1):
+                    k = i + di
+                    l = j + dj
+                    if 0 <= k < grid_height and 0 <= l < grid_width:
+                        weight = weights[k, l]
+                        prior = compute_prior(curr_x, curr_y, xs[l], ys[k], mu_x, mu_y, dt)
+                        total_flow += weight * prior
+            new_weights[i, j] = total_flow
+            sum += total_flow
+    # in place, so the result keeps the dtype of the input grid
+    new_weights /= sum
+    return new_weights
+
+# ---------------------------------------------------------------------------
+# Multi-threaded kernels
+# ---------------------------------------------------------------------------
+#
+# Every output row of the prediction, likelihood and estimate loops depends
+# only on the input grid, so the row loops run under prange and sums are
+# accumulated per row and reduced afterwards. The fastmath flags allow
+# reassociation and fast approximations but not the no-NaN / no-Inf
+# assumptions: the update works in log space, where empty cells are -inf.
+# Thread count is numba's (numba.set_num_threads / NUMBA_NUM_THREADS).
+
+SAFE_FASTMATH = {"nsz", "arcp", "contract", "afn", "reassoc"}
+
+
+@njit(parallel=True, fastmath=SAFE_FASTMATH, cache=True)
+def predict_parallel(weights, xs, ys, mu, dt, res):
+    # same Chapman-Kolmogorov window sum as predict_jit, one row per thread
+    grid_height, grid_width = weights.shape
+    new_weights = np.zeros_like(weights)
+    mu_x, mu_y = mu[0], mu[1]
+    motion_radius = int((mu_x**2 + mu_y**2)**0.5 * dt / res) + 3
+    row_sums = np.zeros(grid_height)
+
+    for i in prange(grid_height):
+        for j in range(grid_width):
+            curr_x, curr_y = xs[j], ys[i]
+            total_flow = 0.0
+            for k in range(max(i - motion_radius, 0), min(i + motion_radius + 1, grid_height)):
+                for l in range(max(j - motion_radius, 0), min(j + motion_radius + 1, grid_width)):
+                    total_flow += weights[k, l] * compute_prior(curr_x, curr_y, xs[l], ys[k],
+                                                                mu_x, mu_y, dt)
+            new_weights[i, j] = total_flow
+            row_sums[i] += total_flow
+    new_weights /= np.sum(row_sums)
+    return new_weights
+
+
+@njit(parallel=True, fastmath=SAFE_FASTMATH, cache=True)
+def update_parallel(weights, dist, z_k, sensor_std):
+    # in-place Bayes update weights *= p(z_k | cell) through log space, as
+    # AGF.update; returns False (weights untouched) if every cell is -inf.
+    # The log-weights are held in float64 even for a float32 grid.
+    grid_height, grid_width = weights.shape
+    n_beacons = len(z_k)
+    log_coeff = -np.log(np.sqrt(2 * np.pi) * sensor_std)
+    log_w = np.empty(weights.shape)
+    row_max = np.full(grid_height, -np.inf)
+
+    for i in prange(grid_height):
+        for j in range(grid_width):
+            ll = n_beacons * log_coeff
+            for b in range(n_beacons):
+                error = z_k[b] - dist[i, j, b]
+                ll -= error * error / (2 * sensor_std**2)
+            w = weights[i, j]
+            v = np.log(w) + ll if w > 0 else -np.inf
+            log_w[i, j] = v
+            if v > row_max[i]:
+                row_max[i] = v
+
+    max_log = np.max(row_max)
+    if not np.isfinite(max_log):
+        return False
+
+    row_sums = np.zeros(grid_height)
+    for i in prange(grid_height):
+        for j in range(grid_width):
+            w = np.exp(log_w[i, j] - max_log)
+            weights[i, j] = w
+            row_sums[i] += w
+    total = np.sum(row_sums)
+    for i in prange(grid_height):
+        for j in range(grid_width):
+            weights[i, j] /= total
+    return True
+
+
+@njit(parallel=True, fastmath=SAFE_FASTMATH, cache=True)
+def estimate_parallel(weights, xs, ys):
+    # weighted mean of the cell centres; returns a (2,) array
+    grid_height, grid_width = weights.shape
+    row_x = np.zeros(grid_height)
+    row_y = np.zeros(grid_height)
+    for i in prange(grid_height):
+        mass = 0.0
+        for j in range(grid_width):
+            row_x[i] += weights[i, j] * xs[j]
+            mass += weights[i, j]
+        row_y[i] = mass * ys[i]
+    est = np.empty(2)
+    est[0] = np.sum(row_x)
+    est[1] = np.sum(row_y)
+    return est
@@ -1,5 +1,7 @@
-import math, random
+import math
 import numpy as np
+from filters.likelihood import range_log_likelihood, normalize_log_weights, log_of_weights
+from filters.particle_base import ArrayParticleFilter
 
 # Auxiliary Sampling Importance Resampling (ASIR)
 # Arulampalam et al. (2002), "A Tutorial on Particle Filters for Online
@@ -10,26 +12,14 @@ import numpy as np
 # for particle i (not a stochastic sample). This concentrates particles in regions
 # the upcoming measurement favors. The final weights correct for this pre-selection
 # via the ratio p(z_k | x_k^i) / p(z_k | mu_k^{j^i}).
+#
+# Particles are held as x, y and weight arrays, so each stage of the update
+# is a single NumPy pass over all N_s particles.
 
-class Particle:
-    def __init__(self, x, y, weight=1.0):
-        self.x = x
-        self.y = y
-        self.weight = weight
-
-
-class ASIRFilter:
-    def __init__(self, N_s, width, height):
-        self.N_s = N_s
-        deviation = 200
-        self.particles = [
-            Particle(
-                random.uniform(700 - deviation, 700 + deviation),
-                random.uniform(250 - deviation, 250 + deviation),
-                weight=1.0 / N_s,
-            )
-            for _ in range(N_s)
-        ]
+class ASIRFilter(ArrayParticleFilter):
+    # with kld=True the particle count is chosen at the first-stage resample
+    def __init__(self, N_s, width, height, **kwargs):
+        super().__init__(N_s, width, height, **kwargs)
         self._mu = None
         self._dt = None
 
@@ -41,104 +31,58 @@ class ASIRFilter:
     # Internal helpers
     # ------------------------------------------------------------------
 
-    def _log_likelihood(self, x, y, z_k, beacon_positions, sensor_std):
-        ll = 0.0
-        for z_k_i, beacon_pos in zip(z_k, beacon_positions):
-            dx = x - beacon_pos[0]
-            dy = y - beacon_pos[1]
-            dist = math.sqrt(dx ** 2 + dy ** 2)
-            error = z_k_i - dist
-            ll += -(error ** 2) / (2 * sensor_std ** 2) - math.log(math.sqrt(2 * math.pi) * sensor_std)
-        return ll
-
-    def _predicted_mean(self, p):
+    def _predicted_means(self):
         # E[Beta(6,2)] = 6/8 = 0.75, matching the motion model used in predict
         alpha = 0.75
-        return (
-            p.x + self._mu[0] * alpha * self._dt,
-            p.y + self._mu[1] * alpha * self._dt,
-        )
-
-    def _propagate_sample(self, p):
-        alpha = random.betavariate(6, 2)
-        angle = random.uniform(0, 2 * math.pi)
-        r = random.gauss(0.0, 8.0)
-        return (
-            p.x + self._mu[0] * alpha * self._dt + r * math.cos(angle),
-            p.y + self._mu[1] * alpha * self._dt + r * math.sin(angle),
-        )
-
-    def _systematic_resample(self, weights):
-        N_s = self.N_s
-        cdf = np.cumsum(weights)
-        cdf[-1] = 1.0  # guard against floating-point shortfall
-        u1 = random.uniform(0, 1.0 / N_s)
-        indices = []
-        i = 0
-        for j in range(N_s):
-            uj = u1 + j / N_s
-            while i < N_s - 1 and uj > cdf[i]:
-                i += 1
-            indices.append(i)
-        return indices
+        return np.column_stack((
+            self.x + self._mu[0] * alpha * self._dt,
+            self.y + self._mu[1] * alpha * self._dt,
+        ))
+
+    def _propagate_samples(self, x, y):
+        n = len(x)
+        alpha = np.random.beta(6, 2, n)
+        angle = np.random.uniform(0, 2 * math.pi, n)
+        r = np.random.normal(0.0, 8.0, n)
+        return np.column_stack((
+            x + self._mu[0] * alpha * self._dt + r * np.cos(angle),
+            y + self._mu[1] * alpha * self._dt + r * np.sin(angle),
+        ))
 
     # ------------------------------------------------------------------
     # ASIR update (Algorithm 4)
     # ------------------------------------------------------------------
 
     def update(self, z_k, beacon_positions, sensor_std):
-        N_s = self.N_s
-        particles = self.particles
-
         # Step 1: representative points and first-stage log-weights
         #   lambda^i  ∝  w^{i}_{k-1} * p(z_k | mu_k^i)
-        pred_means = [self._predicted_mean(p) for p in particles]
-        log_lambdas = np.array([
-            math.log(p.weight + 1e-300) + self._log_likelihood(mx, my, z_k, beacon_positions, sensor_std)
-            for p, (mx, my) in zip(particles, pred_means)
-        ])
+        pred_means = self._predicted_means()
+        field = self._distance_lookup(beacon_positions)
+        log_lik_means = range_log_likelihood(pred_means, beacon_positions, z_k, sensor_std, field)
+        lambdas = normalize_log_weights(log_of_weights(self.weights) + log_lik_means)
 
-        # Subtract max before exponentiating for numerical stability
-        log_lambdas -= log_lambdas.max()
-        lambdas = np.exp(log_lambdas)
-        lambdas /= lambdas.sum()
-
-        # Step 2: systematic resample to select N_s ancestor indices
-        indices = self._systematic_resample(lambdas)
+        # Step 2: resample (systematic by default) to select N_s ancestor indices,
+        # or a KLD-adaptive count binned on the predicted means
+        indices = self._select_ancestors(lambdas, pred_means)
 
         # Step 3 & 4: propagate resampled ancestors; compute correction weights
         #   w_k^i  ∝  p(z_k | x_k^i) / p(z_k | mu_k^{j^i})
-        new_particles = []
-        log_weights = []
-        for j in indices:
-            src = particles[j]
-            mx, my = pred_means[j]
-
-            new_x, new_y = self._propagate_sample(src)
-
-            log_w = (
-                self._log_likelihood(new_x, new_y, z_k, beacon_positions, sensor_std)
-                - self._log_likelihood(mx, my, z_k, beacon_positions, sensor_std)
-            )
-            new_particles.append(Particle(new_x, new_y))
-            log_weights.append(log_w)
+        # The first-stage likelihoods are reused for the denominator.
+        prev_pos = np.column_stack((self.x[indices], self.y[indices]))
+        new_pos = self._propagate_samples(prev_pos[:, 0], prev_pos[:, 1])
+        log_weights = (
+            range_log_likelihood(new_pos, beacon_positions, z_k, sensor_std, field)
+            - log_lik_means[indices]
+        )
+        if self.map_constraint is not None:
+            log_weights += self.map_constraint.log_prior(new_pos, prev_pos)
 
         # Normalize in log-space
-        log_weights = np.array(log_weights)
-        log_weights -= log_weights.max()
-        weights = np.exp(log_weights)
-        weights /= weights.sum()
-
-        for p, w in zip(new_particles, weights):
-            p.weight = float(w)
-
-        self.particles = new_particles
-
-    def effective_sample_size(self):
-        s = sum(p.weight ** 2 for p in self.particles)
-        return 1.0 / s if s > 0 else float(self.N_s)
-
-    def get_estimated_state(self):
-        x = sum(p.x * p.weight for p in self.particles)
-        y = sum(p.y * p.weight for p in self.particles)
-        return np.array([x, y])
+        self.x = new_pos[:, 0].astype(self.dtype)
+        self.y = new_pos[:, 1].astype(self.dtype)
+        self.weights = normalize_log_weights(log_weights, self.dtype)
+
+    def resample(self):
+        # second resample on the corrected weights, when the policy asks for it;
+        # never KLD, the count was already chosen in the first stage
+        self._keep(self._resample_indices(self.weights))
@@ -54,7 +54,10 @@ class EKF:
                 H.append([dx / dist, dy / dist])
         return np.array(H)  # Shape: (num_beacons, 2)
 
-    def update(self, z_k):
+    def update(self, z_k, beacon_positions=None, sensor_std=None):
+        # beacon_positions / sensor_std are accepted for the common filter
+        # interface; the EKF keeps the ones it was constructed with.
+
         # since the observation model is nonlinear in this case (square root)
         # we must take the jacobian of the observation model evaluated at the 
         # predicted state. this gives us the first order taylor approximation 
@@ -77,6 +80,9 @@ class EKF:
 
     def get_state(self):
         return self.state
+
+    def get_estimated_state(self):
+        return np.asarray(self.state, dtype=float).copy()
     
     def get_covariance(self):
         return self.covariance
@@ -0,0 +1,178 @@
+from collections import OrderedDict
+import numpy as np
+
+# Shared range-only measurement model for the particle filters.
+#
+# Each beacon reports z_k^i = ||x_k - b_i|| + v_i with v_i ~ N(0, sensor_std^2),
+# independent across beacons, so the joint log-likelihood of a particle is the
+# sum of per-beacon Gaussian log-densities. Working in log space keeps the
+# product over many beacons (and tight sensor_std) from underflowing to zero.
+#
+# Beacons never move, so the distance part of the model can be precomputed:
+# distance_fields() gives the exact per-beacon distance to every cell of a grid
+# filter, and DistanceField is a bilinear lookup table the particle filters can
+# use instead of a sqrt per particle and beacon. LikelihoodTableCache goes one
+# step further for grids when z_k is quantized, caching whole log-likelihood
+# fields so an update is a sum of cached arrays.
+
+
+def range_log_likelihood_from_distances(dist, z_k, sensor_std):
+    """
+    log p(z_k | x) given the (..., M) predicted ranges to each beacon.
+    Sums over the last axis; returns an array of shape (...).
+    """
+    z_k = np.asarray(z_k, dtype=float)
+    error = z_k - dist
+    log_coeff = -np.log(np.sqrt(2 * np.pi) * sensor_std)
+    return np.sum(-(error ** 2) / (2 * sensor_std ** 2), axis=-1) + len(z_k) * log_coeff
+
+
+def range_log_likelihood(positions, beacon_positions, z_k, sensor_std, distance_field=None):
+    """
+    log p(z_k | x) for every row of `positions` in one broadcasted pass.
+
+    positions:        (N, 2) particle states [x, y]
+    beacon_positions: (M, 2) beacon locations
+    z_k:              (M,)   measured ranges
+    distance_field:   optional DistanceField for the same beacons
+    returns:          (N,)   log-likelihoods
+    """
+    positions = np.asarray(positions, dtype=float)
+
+    if distance_field is not None:
+        dist = distance_field.lookup(positions)
+    else:
+        # (N, M) distance from every particle to every beacon
+        beacons = np.asarray(beacon_positions, dtype=float)
+        dx = positions[:, 0, None] - beacons[:, 0]
+        dy = positions[:, 1, None] - beacons[:, 1]
+        dist = np.sqrt(dx**2 + dy**2)
+
+    return range_log_likelihood_from_distances(dist, z_k, sensor_std)
+
+
+def log_of_weights(weights):
+    """
+    float64 log of stored weights, floored at 1e-300 so a zero weight stays
+    finite. Done in float64 even for float32 weights, where the floor itself
+    would underflow to zero.
+    """
+    return np.log(np.asarray(weights, dtype=float) + 1e-300)
+
+
+def normalize_log_weights(log_weights, dtype=float):
+    """
+    Turn unnormalized log-weights into a normalized weight vector using the
+    log-sum-exp trick. Falls back to uniform weights if every entry is -inf.
+    The shift and sum run in float64; only the result is cast to dtype.
+    """
+    log_weights = np.asarray(log_weights, dtype=float)
+    max_log = np.max(log_weights)
+    if not np.isfinite(max_log):
+        return np.full(log_weights.shape, 1.0 / log_weights.size, dtype=dtype)
+    weights = np.exp(log_weights - max_log)
+    return (weights / np.sum(weights)).astype(dtype, copy=False)
+
+
+# ---------------------------------------------------------------------------
+# Precomputed distance fields
+# ---------------------------------------------------------------------------
+
+def distance_fields(beacon_positions, xs, ys):
+    """
+    Exact distance from every beacon to every point of the grid xs (W,) x ys (H,).
+    Returns an (H, W, M) array, so a slice [rows, cols] feeds straight into
+    range_log_likelihood_from_distances.
+    """
+    beacons = np.asarray(beacon_positions, dtype=float)
+    dx = np.asarray(xs, dtype=float)[None, :, None] - beacons[:, 0]
+    dy = np.asarray(ys, dtype=float)[:, None, None] - beacons[:, 1]
+    return np.sqrt(dx**2 + dy**2)
+
+
+class DistanceField:
+    """
+    Bilinear lookup table of beacon distances on a lattice with `cell`-pixel
+    spacing covering [0, width] x [0, height]. Points outside the map fall back
+    to the exact distance. The interpolation error is about cell^2 / (4 d) for
+    a point at distance d from a beacon, well below a pixel for the default
+    2 px lattice except right next to the beacon.
+    """
+
+    def __init__(self, beacon_positions, width, height, cell=2.0):
+        self.beacons = np.array(beacon_positions, dtype=float)
+        self.width = width
+        self.height = height
+        self.cell = float(cell)
+        self.n_x = int(np.ceil(width / self.cell)) + 1
+        self.n_y = int(np.ceil(height / self.cell)) + 1
+        xs = np.arange(self.n_x) * self.cell
+        ys = np.arange(self.n_y) * self.cell
+        self.table = distance_fields(self.beacons, xs, ys)  # (n_y, n_x, M)
+
+    def matches(self, beacon_positions):
+        return np.array_equal(self.beacons, np.asarray(beacon_positions, dtype=float))
+
+    def lookup(self, positions):
+        # (N, M) interpolated distances for (N, 2) positions
+        gx = positions[:, 0] / self.cell
+        gy = positions[:, 1] / self.cell
+        j = np.clip(np.floor(gx).astype(int), 0, self.n_x - 2)
+        i = np.clip(np.floor(gy).astype(int), 0, self.n_y - 2)
+        tx = (gx - j)[:, None]
+        ty = (gy - i)[:, None]
+
+        t = self.table
+        top = t[i, j] * (1 - tx) + t[i, j + 1] * tx
+        bottom = t[i + 1, j] * (1 - tx) + t[i + 1, j + 1] * tx
+        dist = top * (1 - ty) + bottom * ty
+
+        outside = (gx < 0) | (gx > self.n_x - 1) | (gy < 0) | (gy > self.n_y - 1)
+        if np.any(outside):
+            p = positions[outside]
+            dist[outside] = np.sqrt((p[:, 0, None] - self.beacons[:, 0])**2
+                                    + (p[:, 1, None] - self.beacons[:, 1])**2)
+        return dist
+
+
+def cached_distance_field(field, beacon_positions, width, height, cell=2.0):
+    # reuse `field` while the beacons are unchanged, otherwise build a new one
+    if field is not None and field.matches(beacon_positions):
+        return field
+    return DistanceField(beacon_positions, width, height, cell)
+
+
+class LikelihoodTableCache:
+    """
+    LRU cache of per-beacon log-likelihood fields keyed on the quantized range.
+
+    With z_k rounded to a multiple of `quantum`, a sensor only ever produces a
+    few hundred distinct readings, so the (H, W) log-likelihood field for each
+    (beacon, reading, sensor_std) can be computed once from the distance field
+    and reused. The quantization error is at most quantum / 2 in range.
+    """
+
+    def __init__(self, quantum, max_tables=256):
+        self.quantum = float(quantum)
+        self.max_tables = max_tables
+        self._tables = OrderedDict()
+
+    def quantize(self, z):
+        return round(float(z) / self.quantum) * self.quantum
+
+    def table(self, fields, beacon, z, sensor_std):
+        # log-likelihood field of one beacon's reading; `fields` is (H, W, M)
+        key = (beacon, self.quantize(z), float(sensor_std))
+        table = self._tables.get(key)
+        if table is None:
+            table = range_log_likelihood_from_distances(
+                fields[..., beacon:beacon + 1], [key[1]], sensor_std)
+            self._tables[key] = table
+            if len(self._tables) > self.max_tables:
+                self._tables.popitem(last=False)
+        else:
+            self._tables.move_to_end(key)
+        return table
+
+    def clear(self):
+        self._tables.clear()
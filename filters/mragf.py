@@ -0,0 +1,326 @@
+import numpy as np
+from filters.agf import transition_kernel_1d, convolve_axis
+from filters.likelihood import distance_fields, range_log_likelihood_from_distances
+
+# Multi-resolution approximated grid-based filter.
+#
+# A uniform grid ties accuracy to cost: halving the cell size quadruples the
+# number of cells everywhere, including the large areas of the map where the
+# posterior is negligible. This filter keeps a two-level pyramid instead:
+#
+#   - a coarse grid of `resolution`-pixel cells covering the whole map, and
+#   - fine cells (resolution / refine_factor pixels) inside the coarse cells
+#     that currently hold significant probability mass.
+#
+# After every update, coarse cells above refine_mass (plus a one-cell halo, so
+# the peak and the range ring have fine support around them) are split into
+# refine_factor x refine_factor fine cells, and refined cells whose mass fell
+# below coarsen_mass are merged back. Mass is conserved in both directions:
+# a refined cell receives its coarse mass spread uniformly, a coarsened cell
+# receives the sum of its fine block.
+#
+# The fine cells are held as a dense array over the bounding box of the refined
+# coarse cells (zero in unrefined blocks), so prediction on both levels is the
+# same separable Gaussian convolution as AGF's "separable" mode. Mass that the
+# coarse convolution moves into refined cells is pushed down to the fine level,
+# and mass that the fine convolution moves out of refined cells is summed up
+# into the coarse level.
+
+
+def _upsample(a, f):
+    # each coarse entry repeated over its f x f fine block
+    return np.repeat(np.repeat(a, f, axis=0), f, axis=1)
+
+def _block_sum(a, f):
+    h, w = a.shape
+    return a.reshape(h // f, f, w // f, f).sum(axis=(1, 3))
+
+def _dilate(mask):
+    # 8-neighbour binary dilation by one cell
+    padded = np.pad(mask, 1)
+    out = np.zeros_like(mask)
+    h, w = mask.shape
+    for di in range(3):
+        for dj in range(3):
+            out |= padded[di:di + h, dj:dj + w]
+    return out
+
+def _bounding_box(mask):
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if len(rows) == 0:
+        return None
+    return (int(rows[0]), int(rows[-1] + 1), int(cols[0]), int(cols[-1] + 1))
+
+
+class MultiResAGF:
+    def __init__(self, WIDTH, HEIGHT, resolution, start_pos, refine_factor=5,
+                 refine_mass=1e-3, coarsen_mass=2e-4, max_refined=150,
+                 sigma=15, alpha=0.75):
+        self.coarse_res = resolution
+        self.factor = refine_factor
+        self.res = resolution / refine_factor  # effective resolution near the target
+        self.grid_height = HEIGHT // resolution
+        self.grid_width = WIDTH // resolution
+        self.N_s = self.grid_width * self.grid_height
+
+        self.refine_mass = refine_mass
+        self.coarsen_mass = coarsen_mass
+        self.max_refined = max_refined
+        self.sigma = sigma
+        self.alpha = alpha
+
+        # level 0: mass of unrefined coarse cells (zero where refined)
+        self.coarse = np.zeros((self.grid_height, self.grid_width))
+        self.refined = np.zeros((self.grid_height, self.grid_width), dtype=bool)
+        # level 1: fine mass over the coarse bounding box `box` of refined cells
+        self.box = None
+        self.fine = np.zeros((0, 0))
+
+        # per-beacon distance fields for both levels, rebuilt only if the beacons move
+        self._beacons = None
+        self._dist_coarse = None
+        self._dist_fine = None
+
+        # intialize weight grid
+        start_std = 100
+        self.initialize_weights_gaussian(start_pos, start_std)
+        self._refine()
+
+    def initialize_weights_gaussian(self, start_pos, sigma):
+        x0, y0 = start_pos
+        xs, ys = self._centers(0, self.grid_height, 0, self.grid_width, self.coarse_res)
+        self.coarse = np.exp(-((xs - x0)**2 + (ys - y0)**2) / (2 * sigma**2))
+        self.coarse /= np.sum(self.coarse)
+
+    # ------------------------------------------------------------------
+    # Geometry helpers
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _centers(i0, i1, j0, j1, res):
+        # (x, y) cell-centre grids for rows i0:i1, cols j0:j1 at cell size res
+        xs = (np.arange(j0, j1) + 0.5) * res
+        ys = (np.arange(i0, i1) + 0.5) * res
+        return np.meshgrid(xs, ys)
+
+    def _fine_centers(self, box):
+        i0, i1, j0, j1 = box
+        f = self.factor
+        return self._centers(i0 * f, i1 * f, j0 * f, j1 * f, self.res)
+
+    @staticmethod
+    def _slices(box):
+        i0, i1, j0, j1 = box
+        return (slice(i0, i1), slice(j0, j1))
+
+    def _embed_fine(self, box):
+        # current fine array copied into a zero array over a larger coarse box
+        f = self.factor
+        i0, i1, j0, j1 = box
+        out = np.zeros(((i1 - i0) * f, (j1 - j0) * f))
+        if self.box is not None:
+            a0, a1, b0, b1 = self.box
+            out[(a0 - i0) * f:(a1 - i0) * f, (b0 - j0) * f:(b1 - j0) * f] = self.fine
+        return out
+
+    def _kernels(self, mu, dt, res):
+        # separable transition kernels, normalized to conserve mass across levels
+        gx = transition_kernel_1d(self.alpha * mu[0] * dt, res, self.sigma)
+        gy = transition_kernel_1d(self.alpha * mu[1] * dt, res, self.sigma)
+        return gx / np.sum(gx), gy / np.sum(gy)
+
+    def _distance_fields(self, beacon_positions):
+        if self._beacons is None or not np.array_equal(self._beacons, beacon_positions):
+            self._beacons = np.array(beacon_positions, dtype=float)
+            f = self.factor
+            self._dist_coarse = distance_fields(
+                self._beacons,
+                (np.arange(self.grid_width) + 0.5) * self.coarse_res,
+                (np.arange(self.grid_height) + 0.5) * self.coarse_res)
+            self._dist_fine = distance_fields(
+                self._beacons,
+                (np.arange(self.grid_width * f) + 0.5) * self.res,
+                (np.arange(self.grid_height * f) + 0.5) * self.res)
+        return self._dist_coarse, self._dist_fine
+
+    def _normalize(self):
+        total = np.sum(self.coarse) + np.sum(self.fine)
+        if total > 0:
+            self.coarse /= total
+            self.fine /= total
+        else:
+            print("weights messed up, normalizing uniformly")
+            self.coarse[:] = 1.0 / self.N_s
+            self.refined[:] = False
+            self.box = None
+            self.fine = np.zeros((0, 0))
+
+    # ------------------------------------------------------------------
+    # Adaptive refinement
+    # ------------------------------------------------------------------
+
+    def _cell_mass(self):
+        mass = self.coarse.copy()
+        if self.box is not None:
+            mass[self._slices(self.box)] += _block_sum(self.fine, self.factor)
+        return mass
+
+    def _refine(self):
+        f = self.factor
+        mass = self._cell_mass()
+
+        # refine around significant mass; keep refined cells until they fall
+        # below the (lower) coarsen threshold so cells do not flicker
+        new = _dilate(mass > self.refine_mass) | (self.refined & (mass > self.coarsen_mass))
+        if np.count_nonzero(new) > self.max_refined:
+            cutoff = np.partition(mass[new], -self.max_refined)[-self.max_refined]
+            new &= mass >= cutoff
+
+        new_box = _bounding_box(new)
+        if new_box is None:
+            self.coarse = mass
+            self.refined = new
+            self.box = None
+            self.fine = np.zeros((0, 0))
+            return
+
+        # work over the union of the old and new fine boxes
+        union = new_box if self.box is None else (
+            min(new_box[0], self.box[0]), max(new_box[1], self.box[1]),
+            min(new_box[2], self.box[2]), max(new_box[3], self.box[3]),
+        )
+        region = self._slices(union)
+        fine = self._embed_fine(union)
+
+        newly = new[region] & ~self.refined[region]
+        fine += _upsample(np.where(newly, self.coarse[region], 0.0), f) / f**2
+        fine *= _upsample(new[region], f)
+
+        coarsened = self.refined & ~new
+        self.coarse[coarsened] = mass[coarsened]
+        self.coarse[new] = 0.0
+
+        i0, i1, j0, j1 = new_box
+        u0, _, v0, _ = union
+        self.fine = fine[(i0 - u0) * f:(i1 - u0) * f, (j0 - v0) * f:(j1 - v0) * f].copy()
+        self.box = new_box
+        self.refined = new
+
+    # ------------------------------------------------------------------
+    # Filter steps
+    # ------------------------------------------------------------------
+
+    def predict(self, mu, dt):
+        f = self.factor
+
+        gx, gy = self._kernels(mu, dt, self.coarse_res)
+        coarse = convolve_axis(convolve_axis(self.coarse, gx, axis=1), gy, axis=0)
+
+        if self.box is None:
+            self.coarse = coarse
+            self._normalize()
+            return
+
+        # fine convolution over the refined box padded by the fine kernel reach
+        gx, gy = self._kernels(mu, dt, self.res)
+        pad_i = -(-(len(gy) // 2) // f)
+        pad_j = -(-(len(gx) // 2) // f)
+        i0, i1, j0, j1 = self.box
+        window = (max(i0 - pad_i, 0), min(i1 + pad_i, self.grid_height),
+                  max(j0 - pad_j, 0), min(j1 + pad_j, self.grid_width))
+        region = self._slices(window)
+        fine = self._embed_fine(window)
+        fine = convolve_axis(convolve_axis(fine, gx, axis=1), gy, axis=0)
+
+        refined = self.refined[region]
+
+        # fine mass that left the refined cells moves up to the coarse level
+        leaked = _block_sum(fine, f)
+        coarse_region = coarse[region]
+        coarse_region[~refined] += leaked[~refined]
+        fine *= _upsample(refined, f)
+
+        # coarse mass that entered refined cells moves down to the fine level
+        fine += _upsample(np.where(refined, coarse_region, 0.0), f) / f**2
+        coarse[self.refined] = 0.0
+
+        w0, _, v0, _ = window
+        self.fine = fine[(i0 - w0) * f:(i1 - w0) * f, (j0 - v0) * f:(j1 - v0) * f].copy()
+        self.coarse = coarse
+        self._normalize()
+
+    def update(self, z_k, beacon_positions, sensor_noise):
+        # multiply in log space on both levels and shift by the joint maximum
+        # of prior + likelihood, as AGF.update does, so only cells negligible
+        # next to the peak can underflow. Mass stays linear between updates
+        # because the prediction convolution needs it that way.
+        dist_coarse, dist_fine = self._distance_fields(beacon_positions)
+        with np.errstate(divide="ignore"):
+            log_coarse = np.log(self.coarse) + range_log_likelihood_from_distances(
+                dist_coarse, z_k, sensor_noise)
+        log_coarse[self.refined] = -np.inf
+        max_log = np.max(log_coarse)
+
+        if self.box is not None:
+            i0, i1, j0, j1 = self.box
+            f = self.factor
+            with np.errstate(divide="ignore"):
+                log_fine = np.log(self.fine) + range_log_likelihood_from_distances(
+                    dist_fine[i0 * f:i1 * f, j0 * f:j1 * f], z_k, sensor_noise)
+            max_log = max(max_log, np.max(log_fine))
+            if np.isfinite(max_log):
+                self.fine = np.exp(log_fine - max_log)
+
+        if np.isfinite(max_log):
+            self.coarse = np.exp(log_coarse - max_log)
+        else:
+            # every cell has zero prior or likelihood; _normalize resets
+            self.coarse[:] = 0.0
+            self.fine[:] = 0.0
+        self._normalize()
+        self._refine()
+
+    # ------------------------------------------------------------------
+    # Accessors
+    # ------------------------------------------------------------------
+
+    def get_grid(self):
+        # dense fine-resolution grid of per-cell mass, coarse mass spread evenly
+        f = self.factor
+        grid = _upsample(self.coarse, f) / f**2
+        if self.box is not None:
+            i0, i1, j0, j1 = self.box
+            grid[i0 * f:i1 * f, j0 * f:j1 * f] += self.fine
+        return grid
+
+    def get_cells(self):
+        # (x, y, size, weight) of every nonzero cell on both levels, for rendering
+        # without expanding the coarse level. x, y are top-left corners and
+        # weight is mass per fine-cell area, so both levels share one scale.
+        i, j = np.nonzero(self.coarse)
+        x = [j * self.coarse_res]
+        y = [i * self.coarse_res]
+        size = [np.full(len(i), float(self.coarse_res))]
+        weight = [self.coarse[i, j] / self.factor**2]
+        if self.box is not None:
+            p, q = np.nonzero(self.fine)
+            x.append((q + self.box[2] * self.factor) * self.res)
+            y.append((p + self.box[0] * self.factor) * self.res)
+            size.append(np.full(len(p), self.res))
+            weight.append(self.fine[p, q])
+        return (np.concatenate(x), np.concatenate(y),
+                np.concatenate(size), np.concatenate(weight))
+
+    def get_dimensions(self):
+        return [self.grid_height * self.factor, self.grid_width * self.factor]
+
+    def get_estimated_state(self):
+        xs, ys = self._centers(0, self.grid_height, 0, self.grid_width, self.coarse_res)
+        x = np.sum(self.coarse * xs)
+        y = np.sum(self.coarse * ys)
+        if self.box is not None:
+            xs, ys = self._fine_centers(self.box)
+            x += np.sum(self.fine * xs)
+            y += np.sum(self.fine * ys)
+        return np.array([x, y])
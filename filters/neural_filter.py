@@ -1,7 +1,27 @@
 import os
 import numpy as np
 
-WEIGHTS_PATH = os.path.join(os.path.dirname(__file__), "neural_filter_weights.pt")
+_DIR = os.path.dirname(__file__)
+WEIGHTS_PATH   = os.path.join(_DIR, "neural_filter_weights.pt")   # state_dict, run eagerly
+SCRIPTED_PATH  = os.path.join(_DIR, "neural_filter_scripted.pt")  # traced + frozen TorchScript
+QUANTIZED_PATH = os.path.join(_DIR, "neural_filter_int8.pt")      # dynamic int8 LSTM/Linear, traced
+ONNX_PATH      = os.path.join(_DIR, "neural_filter.onnx")         # run with onnxruntime, no torch
+
+# Inference backends NeuralFilter can load. Only the eager weights are kept
+# in the repo; `train_neural_filter.py --export-only` writes the others next
+# to them. Every variant takes the same inputs and hidden state, so the
+# filters below do not care which one they run.
+#
+# int8 is not shape-invariant: dynamic quantization picks activation scales
+# from each call's input, so stepping a sequence one call per step and
+# running it whole through filter_sequence give estimates that differ by
+# 10-20 px. The float variants agree to float32 round-off.
+MODEL_VARIANTS = {
+    "eager": WEIGHTS_PATH,
+    "torchscript": SCRIPTED_PATH,
+    "int8": QUANTIZED_PATH,
+    "onnx": ONNX_PATH,
+}
 
 # Input features per timestep: [z_k (1 beacon), mu_x, mu_y, dt]
 INPUT_SIZE  = 4
@@ -31,21 +51,111 @@ try:
             out, hidden = self.lstm(x, hidden)
             return self.head(out), hidden
 
+    class _StepModel(nn.Module):
+        # explicit (x, h, c) -> (params, h, c) signature, so the model can be
+        # traced and exported with the hidden state as plain tensors
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, x, h, c):
+            params, (h, c) = self.model(x, (h, c))
+            return params, h, c
+
     _TORCH_OK = True
 
 except ImportError:
     _TORCH_OK = False
 
 
+class _TorchRunner:
+    def __init__(self, module):
+        self.module = module
+
+    def __call__(self, x, hidden):
+        # x: (B, T, 4) float32; hidden: (h, c) from the previous call, or None
+        x = torch.from_numpy(x)
+        if hidden is None:
+            h = c = torch.zeros(NUM_LAYERS, x.shape[0], HIDDEN_SIZE)
+        else:
+            h, c = hidden
+        with torch.inference_mode():
+            params, h, c = self.module(x, h, c)
+        return params.numpy(), (h, c)
+
+
+class _OnnxRunner:
+    def __init__(self, session):
+        self.session = session
+
+    def __call__(self, x, hidden):
+        if hidden is None:
+            h = c = np.zeros((NUM_LAYERS, x.shape[0], HIDDEN_SIZE), dtype=np.float32)
+        else:
+            h, c = hidden
+        params, h, c = self.session.run(None, {"x": x, "h": h, "c": c})
+        return params, (h, c)
+
+
+def _load_model(variant="eager"):
+    """A runner for the given variant, or None (with a message) if unavailable."""
+    if variant not in MODEL_VARIANTS:
+        raise ValueError(
+            f"unknown neural filter variant {variant!r}; expected one of {sorted(MODEL_VARIANTS)}"
+        )
+    path = MODEL_VARIANTS[variant]
+    if variant == "onnx":
+        try:
+            import onnxruntime
+        except ImportError:
+            print("[NeuralFilter] onnxruntime not available — skipping.")
+            return None
+    elif not _TORCH_OK:
+        print("[NeuralFilter] PyTorch not available — skipping.")
+        return None
+    if not os.path.exists(path):
+        hint = "train_neural_filter.py" if variant == "eager" else "train_neural_filter.py --export-only"
+        print(f"[NeuralFilter] No {variant} model found. Run {hint} first.")
+        return None
+
+    if variant == "onnx":
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = 1   # one step is far too small to split
+        return _OnnxRunner(onnxruntime.InferenceSession(path, options,
+                                                        providers=["CPUExecutionProvider"]))
+    if variant == "eager":
+        model = _LSTMFilter()
+        model.load_state_dict(torch.load(path, map_location="cpu", weights_only=True))
+        return _TorchRunner(_StepModel(model).eval())
+    return _TorchRunner(torch.jit.load(path, map_location="cpu"))
+
+
+def _features(z, mu, dt):
+    """Network inputs (..., 4) float32 from ranges (..., m), controls (..., 2), dt (...)."""
+    z, mu = np.asarray(z, dtype=float), np.asarray(mu, dtype=float)
+    dt = np.broadcast_to(np.asarray(dt, dtype=float), z.shape[:-1])
+    return np.concatenate([z[..., :1] / RANGE_SCALE, mu / MU_SCALE,
+                           (dt / DT_SCALE)[..., None]], axis=-1).astype(np.float32)
+
+
+def _decode(params, width, height):
+    """Pixel-space (mean, std), each (..., 2), from network outputs (..., 4)."""
+    scale = np.array([width, height])
+    mean = params[..., :2] * scale
+    std = np.exp(np.clip(params[..., 2:], -4, 2)) * scale
+    return mean, std
+
+
 class NeuralFilter:
     """
     LSTM-based learned Bayesian filter.
-    Trained offline via train_neural_filter.py; loads weights at init.
+    Trained offline via train_neural_filter.py; loads weights at init, or one
+    of the exported variants in MODEL_VARIANTS (variant="onnx", "int8", ...).
     Interface matches the other filters: predict(mu, dt) then update(z_k, ...).
     Outputs a Gaussian posterior (mean + std) for display alongside EKF ellipse.
     """
 
-    def __init__(self, width, height):
+    def __init__(self, width, height, variant="eager"):
         self.width  = width
         self.height = height
         self._state  = np.array([width / 2.0, height / 2.0])
@@ -53,45 +163,75 @@ class NeuralFilter:
         self._mu     = np.zeros(2)
         self._dt     = DT_SCALE
         self._hidden = None
-        self.ready   = False
+        self._model  = _load_model(variant)
+        self.ready   = self._model is not None
 
-        if not _TORCH_OK:
-            print("[NeuralFilter] PyTorch not available — skipping.")
-            return
-        if not os.path.exists(WEIGHTS_PATH):
-            print(f"[NeuralFilter] No weights found. Run train_neural_filter.py first.")
+    def predict(self, mu, dt):
+        self._mu = np.asarray(mu, dtype=float)
+        self._dt = float(dt)
+
+    def update(self, z_k, beacon_positions, sensor_std):
+        if not self.ready:
             return
+        x = _features(z_k, self._mu, self._dt)[None, None]   # (1, 1, 4)
+        params, self._hidden = self._model(x, self._hidden)
+        self._state, self._std = _decode(params[0, 0], self.width, self.height)
+
+    def filter_sequence(self, z_seq, mu_seq, dt_seq):
+        """Offline mode: run whole sequences through the LSTM in one call.
+
+        Takes ranges (T, m), controls (T, 2) and dt (T,) — or with a leading
+        batch axis, (B, T, ...) — and returns the (mean, std) pixel estimates
+        after every step, shaped like the controls. Starts from a fresh hidden
+        state and leaves this filter's own state untouched.
+        """
+        if not self.ready:
+            raise RuntimeError("NeuralFilter has no trained model loaded")
+        x = _features(z_seq, mu_seq, dt_seq)
+        squeeze = x.ndim == 2
+        params, _ = self._model(x[None] if squeeze else x, None)
+        return _decode(params[0] if squeeze else params, self.width, self.height)
+
+    def get_estimated_state(self):
+        return self._state.copy()
+
+    def get_std(self):
+        return self._std.copy()
 
-        self._model = _LSTMFilter()
-        self._model.load_state_dict(
-            torch.load(WEIGHTS_PATH, map_location="cpu", weights_only=True)
-        )
-        self._model.eval()
-        self.ready = True
+
+class BatchedNeuralFilter:
+    """
+    B independent NeuralFilter instances advanced by one LSTM call per step,
+    e.g. one per agent of a sim.batch.BatchSim or per Monte-Carlo run.
+    predict takes controls (B, 2), update takes ranges (B, m), and the
+    estimate and std are (B, 2).
+    """
+
+    def __init__(self, width, height, B, variant="eager"):
+        self.width  = width
+        self.height = height
+        self.B      = B
+        self._model = _load_model(variant)
+        self.ready  = self._model is not None
+        self.reset()
+
+    def reset(self):
+        self._state  = np.tile([self.width / 2.0, self.height / 2.0], (self.B, 1))
+        self._std    = np.tile([self.width / 3.0, self.height / 3.0], (self.B, 1))
+        self._mu     = np.zeros((self.B, 2))
+        self._dt     = np.full(self.B, DT_SCALE)
+        self._hidden = None
 
     def predict(self, mu, dt):
         self._mu = np.asarray(mu, dtype=float)
-        self._dt = float(dt)
+        self._dt = np.broadcast_to(np.asarray(dt, dtype=float), (self.B,))
 
-    def update(self, z_k, beacon_positions, sensor_std):
+    def update(self, z_k, beacon_positions=None, sensor_std=None):
         if not self.ready:
             return
-        import torch
-        with torch.no_grad():
-            feat = [
-                float(z_k[0]) / RANGE_SCALE,
-                self._mu[0]   / MU_SCALE,
-                self._mu[1]   / MU_SCALE,
-                self._dt      / DT_SCALE,
-            ]
-            x = torch.tensor([[feat]], dtype=torch.float32)   # (1, 1, 4)
-            params, self._hidden = self._model(x, self._hidden)
-            p = params[0, 0].numpy()
-            self._state = np.array([p[0] * self.width, p[1] * self.height])
-            self._std   = np.array([
-                np.exp(float(np.clip(p[2], -4, 2))) * self.width,
-                np.exp(float(np.clip(p[3], -4, 2))) * self.height,
-            ])
+        x = _features(z_k, self._mu, self._dt)[:, None]   # (B, 1, 4)
+        params, self._hidden = self._model(x, self._hidden)
+        self._state, self._std = _decode(params[:, 0], self.width, self.height)
 
     def get_estimated_state(self):
         return self._state.copy()
@@ -0,0 +1,101 @@
+import numpy as np
+from filters.likelihood import cached_distance_field
+from filters.resampling import get_resampler, kld_resample, ResamplingPolicy
+
+# Shared state and bookkeeping for the array-based particle filters.
+#
+# ParticleFilter, ASIRFilter and UnscentedParticleFilter differ only in how
+# they propose new particles and weight them. Everything else lives here:
+# particles stored as a structure of arrays (contiguous x, y and weight
+# vectors of length N_s), the resampling scheme and policy, optional KLD
+# adaptive sample sizes, the beacon-distance lookup table, and the
+# estimate / ESS queries. Subclasses implement predict() and update().
+
+class ArrayParticleFilter:
+    def __init__(self, N_s, width, height, resampling="systematic",
+                 distance_lut=False, map_constraint=None, kld=False, kld_bin_size=20.0,
+                 kld_epsilon=0.05, kld_z=2.33, N_min=20, N_max=None, resampling_policy=None,
+                 dtype=np.float64):
+        self.N_s = N_s
+        self._resample_indices = get_resampler(resampling)
+        # decides when maybe_resample() actually resamples, and keeps stats
+        self.resampling_policy = resampling_policy if resampling_policy is not None else ResamplingPolicy()
+        # KLD-sampling (Fox 2003): with kld=True _select_ancestors picks a new
+        # particle count in [N_min, N_max] from the number of occupied
+        # kld_bin_size histogram bins; N_max defaults to the initial N_s
+        self.kld = kld
+        self.kld_bin_size = kld_bin_size
+        self.kld_epsilon = kld_epsilon
+        self.kld_z = kld_z
+        self.N_min = N_min
+        self.N_max = N_s if N_max is None else N_max
+        # optional bilinear beacon-distance lookup table, built on first update
+        self.width = width
+        self.height = height
+        self.distance_lut = distance_lut
+        self._distance_field = None
+        # optional MapConstraint: zero weight inside walls, penalty for crossing one
+        self.map_constraint = map_constraint
+        # self.x = np.random.uniform(0, width, N_s)
+        # self.y = np.random.uniform(0, height, N_s)
+
+        # or, we could spread uniformly around the true start position. this will cause faster convergence of the particles
+        # mitigating error at the start.
+        deviation = 200
+        # storage precision of x, y and weights; likelihoods and normalization
+        # always run in float64 log space, so float32 only narrows what is kept
+        self.dtype = np.dtype(dtype)
+        self.x = np.random.uniform(700 - deviation, 700 + deviation, N_s).astype(self.dtype)
+        self.y = np.random.uniform(250 - deviation, 250 + deviation, N_s).astype(self.dtype)
+        self.weights = np.full(N_s, 1.0 / N_s, dtype=self.dtype)
+
+    @property
+    def particles(self):
+        # read-only record view (p.x, p.y, p.weight) for rendering code
+        view = np.rec.fromarrays((self.x, self.y, self.weights), names="x,y,weight")
+        view.flags.writeable = False
+        return view
+
+    def _distance_lookup(self, beacon_positions):
+        if not self.distance_lut:
+            return None
+        self._distance_field = cached_distance_field(
+            self._distance_field, beacon_positions, self.width, self.height)
+        return self._distance_field
+
+    def _select_ancestors(self, weights, positions):
+        # ancestor indices drawn with the configured scheme; with kld=True
+        # their count adapts to how spread out positions is, and N_s follows
+        if not self.kld:
+            return self._resample_indices(weights)
+        indices = kld_resample(
+            weights, positions, self._resample_indices,
+            self.kld_bin_size, self.kld_epsilon, self.kld_z, self.N_min, self.N_max)
+        self.N_s = len(indices)
+        return indices
+
+    def _keep(self, indices):
+        # replace the particle set by the given ancestors, with uniform weights
+        self.x = self.x[indices]
+        self.y = self.y[indices]
+        self.weights = np.full(self.N_s, 1.0 / self.N_s, dtype=self.dtype)
+
+    def resample(self):
+        # systematic resampling as detailed by Arulampalam et al. (2002) by
+        # default; any scheme from filters.resampling can be selected
+        positions = np.column_stack((self.x, self.y)) if self.kld else None
+        self._keep(self._select_ancestors(self.weights, positions))
+
+    def maybe_resample(self):
+        # resample only when the resampling policy says the weights have degenerated
+        return self.resampling_policy.apply(self)
+
+    def effective_sample_size(self):
+        # compute approximated N_eff (effective sample size)
+        s = np.dot(self.weights, self.weights)
+        return 1.0 / s if s > 0 else float(self.N_s)
+
+    def get_estimated_state(self):
+        x = np.dot(self.x, self.weights)
+        y = np.dot(self.y, self.weights)
+        return np.array([x, y])
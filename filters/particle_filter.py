@@ -1,85 +1,47 @@
-import math, random, copy
+import math
 import numpy as np
+from filters.likelihood import range_log_likelihood, normalize_log_weights, log_of_weights
+from filters.particle_base import ArrayParticleFilter
 
 # SIS (Sequential Importance Random Sampling)
+#
+# Particles are stored as a structure of arrays (see filters.particle_base):
+# contiguous x, y and weight vectors of length N_s. Every step of the filter
+# is then a handful of NumPy passes over those arrays instead of a Python loop
+# over particle objects.
 
-class Particle:
-    def __init__(self, x, y, weight=1.0):
-        self.x = x
-        self.y = y
-        self.weight = weight
-
-class ParticleFilter:
-    def __init__(self, N_s, width, height):
-        self.N_s = N_s
-        # self.particles = [Particle(random.uniform(0, width), random.uniform(0, height), weight=1.0 / N_s) for _ in range(N_s)]
-
-        # or, we could spread uniformly around the true start position. this will cause faster convergence of the particles
-        # mitigating error at the start. 
-        deviation = 200
-        self.particles = [Particle(random.uniform(700 - deviation, 700 + deviation), random.uniform(250 - deviation, 250 + deviation), weight=1.0 / N_s) for _ in range(N_s)]
+class ParticleFilter(ArrayParticleFilter):
+    def __init__(self, N_s, width, height, **kwargs):
+        super().__init__(N_s, width, height, **kwargs)
+        self._map_log_prior = None
 
     def predict(self, mu, dt):
         # I need to come up with an importance density.
         # I will use the prior for this task (bootstrap filter).
-        for p in self.particles:
-            motion_uncertainty_predict = random.betavariate(6, 2)  # mean = 0.75, matches EKF/AGF alpha
-            angle = random.uniform(0, 2 * math.pi)
-            r = random.gauss(0.0, 8.0)
-            # x = x_0 + v_x*dt + noise
-            # y = y_0 + v_y*dt + noise
-            p.x += (mu[0] * motion_uncertainty_predict) * dt + r * math.cos(angle)
-            p.y += (mu[1] * motion_uncertainty_predict) * dt + r * math.sin(angle)
+        N_s = self.N_s
+        if self.map_constraint is not None:
+            prev = np.column_stack((self.x, self.y))
+        motion_uncertainty_predict = np.random.beta(6, 2, N_s)  # mean = 0.75, matches EKF/AGF alpha
+        angle = np.random.uniform(0, 2 * math.pi, N_s)
+        r = np.random.normal(0.0, 8.0, N_s)
+        # x = x_0 + v_x*dt + noise
+        # y = y_0 + v_y*dt + noise
+        self.x += (mu[0] * motion_uncertainty_predict) * dt + r * np.cos(angle)
+        self.y += (mu[1] * motion_uncertainty_predict) * dt + r * np.sin(angle)
+
+        if self.map_constraint is not None:
+            self._map_log_prior = self.map_constraint.log_prior(
+                np.column_stack((self.x, self.y)), prev)
 
     def update(self, z_k, beacon_positions, sensor_std):
-        sum_weights = 0.0
-        for p in self.particles:
-            # update weight for each particle recursively
-            for z_k_i, beacon_pos in zip(z_k, beacon_positions):
-                dx = p.x - beacon_pos[0]
-                dy = p.y - beacon_pos[1]
-                dist = np.sqrt(dx**2 + dy**2)
-
-                error = z_k_i - dist
-                coeff = 1.0 / (np.sqrt(2 * np.pi) * sensor_std)
-                exponent = - (error ** 2) / (2 * sensor_std ** 2)
-                likelihood = coeff * np.exp(exponent)
-
-                p.weight *= likelihood  # assuming independence
-
-            sum_weights += p.weight
+        # update weight for each particle recursively, in log space so the
+        # product over beacons cannot underflow to zero
+        positions = np.column_stack((self.x, self.y))
+        log_weights = log_of_weights(self.weights) + range_log_likelihood(
+            positions, beacon_positions, z_k, sensor_std, self._distance_lookup(beacon_positions))
+        if self._map_log_prior is not None:
+            log_weights += self._map_log_prior
+            self._map_log_prior = None
 
         # normalize particles to form valid pdf
-        for p in self.particles:
-            p.weight /= sum_weights
-
-    def resample(self):
-        # approximate effective sample size. 
-        N_s = self.N_s
-        particles = self.particles
-
-        # systematic resampling as detailed by Arulampalam et al. (2002)
-        cdf = [particles[0].weight]
-        for i in range(1, N_s):
-            cdf.append(cdf[-1] + particles[i].weight)
-        u1 = random.uniform(0, 1.0 / N_s)
-        i = 0
-        new_particles = []
-        for j in range(N_s):
-            uj = u1 + j / N_s
-            while uj > cdf[i]:
-                i += 1
-            selected = copy.deepcopy(particles[i])
-            selected.weight = 1.0 / N_s
-            new_particles.append(selected)
-        self.particles = new_particles
-
-    def effective_sample_size(self):
-        # compute approximated N_eff (effective sample size) 
-        sum_sq_weights = sum(p.weight ** 2 for p in self.particles)
-        return 1.0 / sum_sq_weights
-
-    def get_estimated_state(self):
-        x = sum(p.x * p.weight for p in self.particles)
-        y = sum(p.y * p.weight for p in self.particles)
-        return np.array([x, y])
+        self.weights = normalize_log_weights(log_weights, self.dtype)
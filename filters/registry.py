@@ -0,0 +1,168 @@
+import random
+from typing import Protocol, runtime_checkable
+import numpy as np
+
+# Common filter interface and registry.
+#
+# Every filter in this package is driven the same way by the simulation loop:
+#
+#   f.predict(mu, dt)
+#   f.update(z_k, beacon_positions, sensor_std)
+#   f.get_estimated_state()  -> (2,) array [x, y]
+#
+# and particle filters additionally expose maybe_resample(). Filter is that
+# contract as a Protocol; build_filters checks every builder's result against
+# it, so a filter missing a method fails when it is built rather than mid-run.
+#
+# The registry maps a short name to a builder that constructs the filter from
+# a FilterConfig, plus the label and colours the renderer uses, so a run only
+# builds (and pays for) the filters it was asked for. Builders import their
+# filter module on first use.
+
+
+@runtime_checkable
+class Filter(Protocol):
+    def predict(self, mu, dt): ...
+
+    def update(self, z_k, beacon_positions, sensor_std): ...
+
+    def get_estimated_state(self): ...
+
+
+class FilterConfig:
+    """Everything a builder may need to construct a filter for one run."""
+
+    def __init__(self, width, height, beacons, start, sensor_noise, N_s=120,
+                 grid_resolution=15, grid_predict_mode="exact", grid_sparse=False,
+                 map_constraint=None, adaptive_particles=False, N_min=20, N_max=None,
+                 resampling_mode="ess", neural_variant="eager", grid_parallel=False,
+                 grid_threads=None, dtype=np.float64):
+        self.width = width
+        self.height = height
+        self.beacons = beacons
+        self.start = start
+        self.sensor_noise = sensor_noise
+        self.N_s = N_s
+        self.grid_resolution = grid_resolution
+        self.grid_predict_mode = grid_predict_mode
+        self.grid_sparse = grid_sparse
+        self.map_constraint = map_constraint
+        self.adaptive_particles = adaptive_particles
+        # KLD particle-count bounds; N_max=None caps at the starting N_s
+        self.N_min = N_min
+        self.N_max = N_max
+        self.resampling_mode = resampling_mode
+        self.neural_variant = neural_variant
+        self.grid_parallel = grid_parallel
+        self.grid_threads = grid_threads
+        self.dtype = dtype  # state precision of the grid and array-backed particle filters
+
+
+class FilterSpec:
+    def __init__(self, name, label, color, estimate_color, build):
+        self.name = name
+        self.label = label
+        self.color = color                    # particles / grid / covariance
+        self.estimate_color = estimate_color  # estimate marker
+        self.build = build
+
+
+FILTER_REGISTRY = {}
+
+DEFAULT_FILTERS = ("pf", "ekf", "agf", "asir")
+
+
+def register_filter(name, label, color, estimate_color=None):
+    def decorator(build):
+        FILTER_REGISTRY[name] = FilterSpec(name, label, color, estimate_color or color, build)
+        return build
+    return decorator
+
+
+def get_filter_spec(name):
+    try:
+        return FILTER_REGISTRY[name]
+    except KeyError:
+        raise ValueError(
+            f"unknown filter {name!r}; expected one of {sorted(FILTER_REGISTRY)}"
+        ) from None
+
+
+def build_filters(names, config) -> dict[str, Filter]:
+    """Build the named filters, in order, as a {name: filter} dict."""
+    filters = {}
+    for spec in (get_filter_spec(name) for name in names):
+        f = spec.build(config)
+        if not isinstance(f, Filter):
+            raise TypeError(
+                f"builder for {spec.name!r} returned {type(f).__name__}, which does not "
+                f"implement the Filter protocol (predict, update, get_estimated_state)"
+            )
+        filters[spec.name] = f
+    return filters
+
+
+# ---------------------------------------------------------------------------
+# Built-in filters
+# ---------------------------------------------------------------------------
+
+def _resampling_policy(config):
+    from filters.resampling import ResamplingPolicy
+    return ResamplingPolicy(config.resampling_mode)
+
+
+@register_filter("pf", "Particle filter (SIR)", (255, 80, 80), (255, 255, 0))
+def _build_pf(config) -> Filter:
+    from filters.particle_filter import ParticleFilter
+    return ParticleFilter(N_s=config.N_s, width=config.width, height=config.height,
+                          map_constraint=config.map_constraint, kld=config.adaptive_particles,
+                          N_min=config.N_min, N_max=config.N_max,
+                          resampling_policy=_resampling_policy(config), dtype=config.dtype)
+
+
+@register_filter("ekf", "Extended Kalman filter", (0, 255, 255))
+def _build_ekf(config) -> Filter:
+    from filters.ekf import EKF
+    start = np.array([config.start[0] + random.gauss(0, 100), config.start[1] + random.gauss(0, 100)])
+    return EKF(start, np.diag([100, 100]), config.beacons, config.sensor_noise)
+
+
+@register_filter("agf", "Grid filter (AGF)", (255, 0, 255))
+def _build_agf(config) -> Filter:
+    from filters.agf import AGF
+    return AGF(config.width, config.height, config.grid_resolution, list(config.start),
+               predict_mode=config.grid_predict_mode, sparse=config.grid_sparse,
+               map_constraint=config.map_constraint, parallel=config.grid_parallel,
+               num_threads=config.grid_threads, dtype=config.dtype)
+
+
+@register_filter("asir", "ASIR particle filter", (255, 140, 0))
+def _build_asir(config) -> Filter:
+    from filters.asir import ASIRFilter
+    return ASIRFilter(N_s=config.N_s, width=config.width, height=config.height,
+                      map_constraint=config.map_constraint, kld=config.adaptive_particles,
+                      N_min=config.N_min, N_max=config.N_max,
+                      resampling_policy=_resampling_policy(config), dtype=config.dtype)
+
+
+@register_filter("upf", "Unscented particle filter", (120, 255, 120))
+def _build_upf(config) -> Filter:
+    from filters.upf import UnscentedParticleFilter
+    return UnscentedParticleFilter(config.N_s, config.width, config.height,
+                                   map_constraint=config.map_constraint,
+                                   kld=config.adaptive_particles, N_min=config.N_min,
+                                   N_max=config.N_max,
+                                   resampling_policy=_resampling_policy(config),
+                                   dtype=config.dtype)
+
+
+@register_filter("mragf", "Multi-resolution grid filter", (180, 120, 255))
+def _build_mragf(config) -> Filter:
+    from filters.mragf import MultiResAGF
+    return MultiResAGF(config.width, config.height, config.grid_resolution, list(config.start))
+
+
+@register_filter("neural", "Neural filter (LSTM)", (255, 255, 255))
+def _build_neural(config) -> Filter:
+    from filters.neural_filter import NeuralFilter
+    return NeuralFilter(config.width, config.height, variant=config.neural_variant)
@@ -0,0 +1,188 @@
+import time
+import numpy as np
+
+# Shared resampling schemes for the particle filters.
+#
+# Every scheme takes a normalized weight vector and returns an index array of
+# the selected ancestors, so the caller gathers its own state arrays with
+# fancy indexing. All of them are O(N) (multinomial and residual are
+# O(N log N) through searchsorted) and run as a few NumPy passes.
+# See Douc & Cappé (2005), "Comparison of Resampling Schemes for Particle
+# Filtering", for the variance ordering: residual/stratified/systematic all
+# beat plain multinomial.
+
+
+def _cdf(weights):
+    cdf = np.cumsum(weights)
+    cdf[-1] = 1.0  # guard against floating-point shortfall
+    return cdf
+
+
+def systematic_resample(weights, N=None):
+    # one uniform offset shared by N evenly spaced points (Arulampalam et al. 2002)
+    N = len(weights) if N is None else N
+    u = (np.random.uniform(0, 1.0) + np.arange(N)) / N
+    return np.searchsorted(_cdf(weights), u)
+
+
+def stratified_resample(weights, N=None):
+    # one independent uniform inside each of the N strata
+    N = len(weights) if N is None else N
+    u = (np.random.uniform(0, 1.0, N) + np.arange(N)) / N
+    return np.searchsorted(_cdf(weights), u)
+
+
+def multinomial_resample(weights, N=None):
+    # N i.i.d. draws from the categorical distribution
+    N = len(weights) if N is None else N
+    u = np.sort(np.random.uniform(0, 1.0, N))
+    return np.searchsorted(_cdf(weights), u)
+
+
+def residual_resample(weights, N=None):
+    # deterministic floor(N w^i) copies, remainder drawn multinomially
+    N = len(weights) if N is None else N
+    scaled = N * np.asarray(weights)
+    counts = np.floor(scaled).astype(int)
+    indices = np.repeat(np.arange(len(weights)), counts)
+
+    n_rest = N - len(indices)
+    if n_rest > 0:
+        residual = scaled - counts
+        residual /= residual.sum()
+        indices = np.concatenate((indices, multinomial_resample(residual, n_rest)))
+    return indices
+
+
+# ---------------------------------------------------------------------------
+# KLD-sampling: adapt the particle count to the spread of the posterior
+# ---------------------------------------------------------------------------
+#
+# Fox (2003), "Adapting the Sample Size in Particle Filters Through
+# KLD-Sampling". If the posterior occupies k bins of a fixed histogram, then
+#
+#   n = (k - 1) / (2 eps) * (1 - 2 / (9 (k - 1)) + sqrt(2 / (9 (k - 1))) z)^3
+#
+# samples bound the KL divergence between the sample-based and the true
+# (binned) posterior by eps with probability 1 - delta, z being the upper
+# 1 - delta standard-normal quantile. A ring-shaped posterior occupies many
+# bins and keeps n high; a collapsed blob occupies a few and lets n drop.
+
+
+def kld_sample_size(k, epsilon=0.05, z=2.33):
+    # particles needed for k occupied bins (z = 2.33 is delta = 0.01)
+    k = np.asarray(k, dtype=float)
+    km1 = np.maximum(k - 1, 1)
+    a = 2.0 / (9.0 * km1)
+    n = km1 / (2 * epsilon) * (1 - a + np.sqrt(a) * z) ** 3
+    return np.where(k > 1, np.ceil(n), 1.0)
+
+
+def kld_resample(weights, positions, resample=systematic_resample, bin_size=20.0,
+                 epsilon=0.05, z=2.33, N_min=1, N_max=None):
+    """
+    Resample a KLD-adaptive number of ancestors, between N_min and N_max.
+
+    Draws N_max ancestors with `resample`, shuffles them so every prefix is a
+    fair sample, and counts for each prefix length n the occupied bins k(n)
+    of their (N, 2) positions. Returns the shortest prefix with
+    n >= kld_sample_size(k(n)), which is what sequential KLD-sampling would
+    stop at, found in one vectorized pass.
+    """
+    N_max = len(weights) if N_max is None else N_max
+    indices = np.random.permutation(resample(weights, N_max))
+
+    # draw order at which each histogram bin is first hit
+    bins = np.floor(np.asarray(positions)[indices] / bin_size).astype(np.int64)
+    _, first = np.unique(bins, axis=0, return_index=True)
+    new_bin = np.zeros(N_max, dtype=bool)
+    new_bin[first] = True
+    k = np.cumsum(new_bin)
+
+    n = np.arange(1, N_max + 1)
+    enough = (n >= kld_sample_size(k, epsilon, z)) & (n >= N_min)
+    n_keep = int(np.argmax(enough)) + 1 if enough.any() else N_max
+    return indices[:n_keep]
+
+
+RESAMPLING_SCHEMES = {
+    "systematic":  systematic_resample,
+    "stratified":  stratified_resample,
+    "multinomial": multinomial_resample,
+    "residual":    residual_resample,
+}
+
+
+def get_resampler(scheme):
+    try:
+        return RESAMPLING_SCHEMES[scheme]
+    except KeyError:
+        raise ValueError(
+            f"unknown resampling scheme {scheme!r}; "
+            f"expected one of {sorted(RESAMPLING_SCHEMES)}"
+        ) from None
+
+
+# ---------------------------------------------------------------------------
+# When to resample
+# ---------------------------------------------------------------------------
+#
+# Resampling fights weight degeneracy but costs time and throws away
+# diversity, so it should only run when the weights have actually degenerated.
+# A ResamplingPolicy makes that call once per step for a particle filter:
+#
+#   "ess":      ESS = 1 / sum(w^2) below ess_fraction * N
+#   "entropy":  normalized weight entropy H(w) / log N below entropy_fraction
+#   "interval": every `interval` steps, regardless of the weights
+#
+# and keeps count of how often it fired and how long the resamples took.
+
+RESAMPLING_POLICY_MODES = ("ess", "entropy", "interval")
+
+
+class ResamplingPolicy:
+    def __init__(self, mode="ess", ess_fraction=0.5, entropy_fraction=0.9, interval=1):
+        if mode not in RESAMPLING_POLICY_MODES:
+            raise ValueError(f"unknown resampling policy {mode!r}; "
+                             f"expected one of {RESAMPLING_POLICY_MODES}")
+        self.mode = mode
+        self.ess_fraction = ess_fraction
+        self.entropy_fraction = entropy_fraction
+        self.interval = interval
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.steps = 0
+        self.fired = 0
+        self.resample_time = 0.0
+
+    def should_resample(self, weights):
+        N = len(weights)
+        if self.mode == "interval":
+            return self.steps % self.interval == 0
+        if self.mode == "ess":
+            return 1.0 / np.dot(weights, weights) < self.ess_fraction * N
+        # entropy of the normalized weights, 0 log 0 = 0
+        nz = weights[weights > 0]
+        entropy = -np.dot(nz, np.log(nz))
+        return N > 1 and entropy < self.entropy_fraction * np.log(N)
+
+    def apply(self, particle_filter):
+        """Resample particle_filter if the policy says so; returns whether it did."""
+        self.steps += 1
+        if not self.should_resample(particle_filter.weights):
+            return False
+        start = time.perf_counter()
+        particle_filter.resample()
+        self.resample_time += time.perf_counter() - start
+        self.fired += 1
+        return True
+
+    def summary(self):
+        return {
+            "steps": self.steps,
+            "fired": self.fired,
+            "rate": self.fired / self.steps if self.steps else 0.0,
+            "time_total": self.resample_time,
+            "time_mean": self.resample_time / self.fired if self.fired else 0.0,
+        }
@@ -1,5 +1,7 @@
-import math, random
+import math
 import numpy as np
+from filters.likelihood import range_log_likelihood, normalize_log_weights, log_of_weights
+from filters.particle_base import ArrayParticleFilter
 
 # Unscented Particle Filter (UPF)
 # van der Merwe et al. (2000); discussed in Arulampalam et al. (2002) §IV-C.
@@ -25,31 +27,50 @@ _Wc = np.array([_LAM / (_N + _LAM) + (1 - _ALPHA**2 + _BETA)]
                + [1 / (2 * (_N + _LAM))] * (2 * _N))
 
 
-class Particle:
-    def __init__(self, x, y, weight=1.0):
-        self.x = x
-        self.y = y
-        self.weight = weight
-
-
-class UnscentedParticleFilter:
-    def __init__(self, N_s, width, height):
-        self.N_s = N_s
+# ------------------------------------------------------------------
+# Batched closed-form 2x2 linear algebra, (N, 2, 2) -> (N, 2, 2)
+# ------------------------------------------------------------------
+
+def _chol2x2(P, jitter=1e-5):
+    # lower Cholesky factor; clamps the pivots like the per-particle jitter retry
+    a = np.maximum(P[:, 0, 0], jitter)
+    l11 = np.sqrt(a)
+    l21 = P[:, 1, 0] / l11
+    l22 = np.sqrt(np.maximum(P[:, 1, 1] - l21**2, jitter))
+    L = np.zeros_like(P)
+    L[:, 0, 0] = l11
+    L[:, 1, 0] = l21
+    L[:, 1, 1] = l22
+    return L
+
+def _inv2x2(S):
+    det = S[:, 0, 0] * S[:, 1, 1] - S[:, 0, 1] * S[:, 1, 0]
+    inv = np.empty_like(S)
+    inv[:, 0, 0] = S[:, 1, 1]
+    inv[:, 1, 1] = S[:, 0, 0]
+    inv[:, 0, 1] = -S[:, 0, 1]
+    inv[:, 1, 0] = -S[:, 1, 0]
+    return inv / det[:, None, None]
+
+
+class UnscentedParticleFilter(ArrayParticleFilter):
+    def __init__(self, N_s, width, height, resampling="systematic",
+                 distance_lut=False, batched=True, map_constraint=None, kld=False, kld_bin_size=20.0,
+                 kld_epsilon=0.05, kld_z=2.33, N_min=20, N_max=None, resampling_policy=None,
+                 dtype=np.float64):
+        # batched: one einsum pass over an (N, 2n+1, 2) sigma-point tensor;
+        # otherwise the reference per-particle UKF loop
+        self.batched = batched
 
         # Fixed process noise covariance — used for every particle's UKF sigma points.
         # Sized to match the dominant OU + dynamics noise in the sim (~35 px/step).
         q = 35.0 ** 2
         self.Q = np.diag([q, q])
 
-        deviation = 200
-        self.particles = [
-            Particle(
-                random.uniform(700 - deviation, 700 + deviation),
-                random.uniform(250 - deviation, 250 + deviation),
-                weight=1.0 / N_s,
-            )
-            for _ in range(N_s)
-        ]
+        super().__init__(N_s, width, height, resampling=resampling, distance_lut=distance_lut,
+                         map_constraint=map_constraint, kld=kld, kld_bin_size=kld_bin_size,
+                         kld_epsilon=kld_epsilon, kld_z=kld_z, N_min=N_min, N_max=N_max,
+                         resampling_policy=resampling_policy, dtype=dtype)
         self._mu = np.zeros(2)
         self._dt = 0.0
 
@@ -113,68 +134,78 @@ class UnscentedParticleFilter:
 
         return mu_prop, P_prop
 
-    def _log_likelihood(self, x, z_k, beacon_positions, sensor_std):
-        ll = 0.0
-        for z_i, (bx, by) in zip(z_k, beacon_positions):
-            dist = math.sqrt((x[0] - bx)**2 + (x[1] - by)**2)
-            ll += (-0.5 * ((z_i - dist) / sensor_std)**2
-                   - math.log(math.sqrt(2 * math.pi) * sensor_std))
-        return ll
+    def _ukf_proposal_batched(self, X_prev, z_k, beacon_positions, sensor_std):
+        """Return (μ_prop, P_prop) of shapes (N, 2), (N, 2, 2) for all particles at once."""
+        z_k     = np.asarray(z_k, dtype=float)
+        beacons = np.asarray(beacon_positions, dtype=float)
+        N, m    = len(X_prev), len(z_k)
+        I       = np.eye(_N)
+
+        # Predict: sigma points (N, 2n+1, 2) around every particle
+        Q      = np.broadcast_to(self.Q, (N, _N, _N))
+        L      = _chol2x2((_N + _LAM) * Q)
+        sp     = self._f(self._sigma_points_batched(X_prev, L))
+        x_pred = np.einsum("s,nsi->ni", _Wm, sp)
+        d      = sp - x_pred[:, None, :]
+        P_pred = Q + np.einsum("s,nsi,nsj->nij", _Wc, d, d)
+
+        # Update
+        sigma2 = self._sigma_points_batched(x_pred, _chol2x2((_N + _LAM) * P_pred))
+        z_pts  = np.sqrt(((sigma2[:, :, None, :] - beacons) ** 2).sum(axis=-1))   # (N, 2n+1, m)
+        z_hat  = np.einsum("s,nsm->nm", _Wm, z_pts)
+        dz     = z_pts - z_hat[:, None, :]
+        dx     = sigma2 - x_pred[:, None, :]
+        S      = np.eye(m) * sensor_std**2 + np.einsum("s,nsm,nsk->nmk", _Wc, dz, dz)
+        Pxz    = np.einsum("s,nsi,nsm->nim", _Wc, dx, dz)
+
+        # closed-form inverse for 1 or 2 beacons, batched LAPACK otherwise
+        if m == 1:
+            S_inv = 1.0 / S
+        elif m == 2:
+            S_inv = _inv2x2(S)
+        else:
+            S_inv = np.linalg.inv(S)
+        K       = Pxz @ S_inv                                                     # (N, 2, m)
+        mu_prop = x_pred + np.einsum("nim,nm->ni", K, z_k - z_hat)
+        P_prop  = P_pred - K @ S @ K.transpose(0, 2, 1)
+        P_prop  = (P_prop + P_prop.transpose(0, 2, 1)) / 2 + 1e-3 * I
+
+        return mu_prop, P_prop
+
+    @staticmethod
+    def _sigma_points_batched(X, L):
+        # X (N, 2), L (N, 2, 2) -> (N, 2n+1, 2): [x, x + L[:, i], x - L[:, i]]
+        cols = L.transpose(0, 2, 1)
+        return np.concatenate((X[:, None, :], X[:, None, :] + cols, X[:, None, :] - cols), axis=1)
 
     # ------------------------------------------------------------------
     # UPF step
     # ------------------------------------------------------------------
 
     def update(self, z_k, beacon_positions, sensor_std):
-        new_particles = []
-        log_weights   = []
-
-        for p in self.particles:
-            x_prev = np.array([p.x, p.y])
-
-            mu_prop, P_prop = self._ukf_proposal(x_prev, z_k, beacon_positions, sensor_std)
-
-            try:
-                x_new = np.random.multivariate_normal(mu_prop, P_prop)
-            except Exception:
-                x_new = mu_prop.copy()
-
-            log_w = (math.log(p.weight + 1e-300)
-                     + self._log_likelihood(x_new, z_k, beacon_positions, sensor_std))
-
-            new_particles.append(Particle(x_new[0], x_new[1]))
-            log_weights.append(log_w)
-
-        log_weights = np.array(log_weights)
-        log_weights -= log_weights.max()
-        weights = np.exp(log_weights)
-        weights /= weights.sum()
-        for p, w in zip(new_particles, weights):
-            p.weight = float(w)
-
-        self.particles = new_particles
-
-    def resample(self):
-        weights = np.array([p.weight for p in self.particles])
-        cdf = np.cumsum(weights)
-        cdf[-1] = 1.0
-        u1 = random.uniform(0, 1.0 / self.N_s)
-        indices, i = [], 0
-        for j in range(self.N_s):
-            uj = u1 + j / self.N_s
-            while i < self.N_s - 1 and uj > cdf[i]:
-                i += 1
-            indices.append(i)
-        self.particles = [
-            Particle(self.particles[k].x, self.particles[k].y, 1.0 / self.N_s)
-            for k in indices
-        ]
-
-    def effective_sample_size(self):
-        s = sum(p.weight**2 for p in self.particles)
-        return 1.0 / s if s > 0 else float(self.N_s)
-
-    def get_estimated_state(self):
-        x = sum(p.x * p.weight for p in self.particles)
-        y = sum(p.y * p.weight for p in self.particles)
-        return np.array([x, y])
+        # UKF algebra stays in float64 whatever the storage dtype
+        X_prev = np.column_stack((self.x, self.y)).astype(float, copy=False)
+
+        if self.batched:
+            mu_prop, P_prop = self._ukf_proposal_batched(X_prev, z_k, beacon_positions, sensor_std)
+            # x = μ + L ε with ε ~ N(0, I), all particles in one draw
+            eps     = np.random.standard_normal((self.N_s, _N))
+            new_pos = mu_prop + np.einsum("nij,nj->ni", _chol2x2(P_prop), eps)
+        else:
+            new_pos = np.empty((self.N_s, _N))
+            for i, x_prev in enumerate(X_prev):
+                mu_prop, P_prop = self._ukf_proposal(x_prev, z_k, beacon_positions, sensor_std)
+
+                try:
+                    new_pos[i] = np.random.multivariate_normal(mu_prop, P_prop)
+                except Exception:
+                    new_pos[i] = mu_prop
+
+        log_weights = log_of_weights(self.weights) + range_log_likelihood(
+            new_pos, beacon_positions, z_k, sensor_std, self._distance_lookup(beacon_positions))
+        if self.map_constraint is not None:
+            log_weights += self.map_constraint.log_prior(new_pos, X_prev)
+
+        self.x = new_pos[:, 0].astype(self.dtype)
+        self.y = new_pos[:, 1].astype(self.dtype)
+        self.weights = normalize_log_weights(log_weights, self.dtype)
@@ -1,41 +1,42 @@
 import pygame
-import sys
 import math
 import random
 import numpy as np
-from filters.particle_filter import ParticleFilter
-from filters.ekf import EKF
-from filters.agf import AGF
-from filters.asir import ASIRFilter
+from filters.registry import FilterConfig, DEFAULT_FILTERS, build_filters, get_filter_spec
+from filters.map_constraint import MapConstraint
 from sim.agent import Agent
 from sim.world import World
-import matplotlib.pyplot as plt
-import time
-import os
+from sim.headless import run_headless
+from sim.harness import FilterHarness, compute_rmse
+
+# toggle keys, assigned to the configured filters in order
+_TOGGLE_KEYS = "qwertyuiop"
+
+def run_simulation(render_sim, T, seed = None, filters=DEFAULT_FILTERS,
+                   track_memory=False, profile_filter=None):
+    # headless runs use the pygame-free core with a fixed time step
+    if not render_sim:
+        results, profile = run_headless(T, seed, filters=filters, track_memory=track_memory,
+                                        profile_filter=profile_filter, return_profile=True)
+        print(profile.report())
+        return results
 
-def run_simulation(render_sim, T, seed = None):
     if seed is not None:
         random.seed(seed)
         np.random.seed(seed)
 
-    if not render_sim:
-        os.environ["SDL_VIDEODRIVER"] = "dummy"
-
     # --- Pygame Setup ---
     pygame.init()
     WIDTH, HEIGHT = 1200, 800
     win = pygame.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption("Bayesian Filter Sim")
-    show_particles = True
-    show_ekf = True
-    show_grid = True
-    show_asir = True
 
     glow_surface = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
     grid_surface = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
 
     def render_grid(grid_weights):
         max_weight = np.max(grid_weights)
+        grid_resolution = WIDTH / grid_weights.shape[1]
         if max_weight > 0:
             for i in range(grid_weights.shape[0]):
                 for j in range(grid_weights.shape[1]):
@@ -49,6 +50,17 @@ def run_simulation(render_sim, T, seed = None):
                     y = i * grid_resolution
                     pygame.draw.rect(grid_surface, color, pygame.Rect(x, y, grid_resolution, grid_resolution))
 
+    def render_cells(xs, ys, sizes, weights):
+        # sparse variant of render_grid for filters with mixed cell sizes;
+        # cells too faint to show are skipped before any draw call
+        max_weight = np.max(weights, initial=0.0)
+        if max_weight <= 0:
+            return
+        alphas = (weights / max_weight * 160).astype(int)
+        for k in np.flatnonzero(alphas):
+            pygame.draw.rect(grid_surface, (255, 255, 255, alphas[k]),
+                             pygame.Rect(xs[k], ys[k], sizes[k], sizes[k]))
+
     def draw_glow(surface, x, y, color, max_radius=20, steps=6):
         r, g, b = color
         for i in range(steps):
@@ -57,6 +69,36 @@ def run_simulation(render_sim, T, seed = None):
             glow_color = (r, g, b, alpha)
             pygame.draw.circle(surface, glow_color, (x, y), radius)
 
+    def draw_ellipse(center, std, color):
+        # 2 SD confidence region
+        radius_x, radius_y = 2 * std[0], 2 * std[1]
+        pygame.draw.ellipse(
+            glow_surface,
+            (*color, 38),
+            pygame.Rect(center[0] - radius_x, center[1] - radius_y, 2 * radius_x, 2 * radius_y),
+            width=0
+        )
+
+    def draw_filter(f, spec, estimate):
+        # pick the belief representation the filter exposes
+        if hasattr(f, "particles"):
+            particles = f.particles
+            max_weight = np.max(particles.weight) + 1e-6
+            for p in particles:
+                size = int(1 + 5 * p.weight / max_weight)
+                pygame.draw.circle(glow_surface, (*spec.color, 130), (int(p.x), int(p.y)), size)
+        elif hasattr(f, "get_cells"):
+            render_cells(*f.get_cells())
+        elif hasattr(f, "get_grid"):
+            render_grid(f.get_grid())
+        if estimate is None:
+            return  # no step has run yet
+        if hasattr(f, "get_covariance"):
+            draw_ellipse(estimate, np.sqrt(np.diag(f.get_covariance())), spec.color)
+        elif hasattr(f, "get_std"):
+            draw_ellipse(estimate, f.get_std(), spec.color)
+        pygame.draw.circle(glow_surface, (*spec.estimate_color, 230), estimate.astype(int), dot_radius)
+
     # Colors
     colors = {
         "background": (22, 28, 35),
@@ -73,8 +115,14 @@ def run_simulation(render_sim, T, seed = None):
     # time step lower bound, ms
     filter_interval = 20
     real_time_filtering = True
-    # number of particles
+    # number of particles (the starting count when adaptive_particles is on)
     N_s = 120
+    # KLD-sampling: pick the particle count at each resample from the posterior spread,
+    # between N_min and N_max; the cap leaves room to grow while the posterior is a ring
+    adaptive_particles = False
+    N_min, N_max = 20, 1500
+    # when the particle filters resample: "ess" (ESS < N/2), "entropy" or "interval"
+    resampling_mode = "ess"
     sensor_noise = 30.0
     # for manual control
     speed = 11
@@ -86,22 +134,29 @@ def run_simulation(render_sim, T, seed = None):
     angle = random.uniform(0, 2 * math.pi)
     mu = np.array([initial_velocity * math.cos(angle), initial_velocity * math.sin(angle)])
     grid_resolution = 15
+    # "exact" window sum, or "separable" / "fft" convolution (much cheaper at fine resolution)
+    grid_predict_mode = "exact"
+    # only touch the grid cells around the posterior blob once it has converged
+    grid_sparse = False
+    # use the wall map: zero weight inside walls, penalty for passing through one
+    map_aware = False
 
     # Initialize world, agent, filter
     world = World(WIDTH, HEIGHT, num_beacons)
     agent = Agent(start_x=700, start_y=250, frame_rate=60, WIDTH=WIDTH, HEIGHT=HEIGHT, radius=10, speed=speed)
-    pf = ParticleFilter(N_s=N_s, width=WIDTH, height=HEIGHT)
-    ekf_start = np.array([agent.rect.x + random.gauss(0, 100), agent.rect.y + random.gauss(0, 100)])
-    ekf = EKF(ekf_start, np.diag([100, 100]), world.beacons, sensor_noise)
-    agf = AGF(WIDTH, HEIGHT, grid_resolution, [agent.rect.x, agent.rect.y])
-    asir = ASIRFilter(N_s=N_s, width=WIDTH, height=HEIGHT)
-
-    ekf_mean = pygame.Rect(agent.rect.x, agent.rect.y, 5, 5)
-
-    error_list_ekf = list()
-    error_list_agf = list()
-    error_list_pf = list()
-    error_list_asir = list()
+    config = FilterConfig(
+        WIDTH, HEIGHT, world.beacons, agent.get_position(), sensor_noise, N_s=N_s,
+        grid_resolution=grid_resolution, grid_predict_mode=grid_predict_mode, grid_sparse=grid_sparse,
+        map_constraint=MapConstraint(world.index, box_size=agent.size) if map_aware else None,
+        adaptive_particles=adaptive_particles, N_min=N_min, N_max=N_max,
+        resampling_mode=resampling_mode,
+    )
+    harness = FilterHarness(build_filters(filters, config), track_memory=track_memory,
+                            profile_filter=profile_filter)
+    specs = [get_filter_spec(name) for name in filters]
+    toggle_keys = {pygame.key.key_code(key): spec.name for key, spec in zip(_TOGGLE_KEYS, specs)}
+    shown = {spec.name: True for spec in specs}
+
     error_list_true = list()
 
     # Countdown before simulation starts (render mode only)
@@ -123,7 +178,7 @@ def run_simulation(render_sim, T, seed = None):
                 for event in pygame.event.get():
                     if event.type == pygame.QUIT:
                         pygame.quit()
-                        return (0, 0, 0, 0, 0)
+                        return {}
 
     clock = pygame.time.Clock()
     last_update = 0
@@ -131,10 +186,6 @@ def run_simulation(render_sim, T, seed = None):
 
     # track time steps
     k = 0
-    pf_predicted_state = agent.get_position()
-    agf_predicted_state = agent.get_position()
-    ekf_predicted_state = agent.get_position()
-    asir_predicted_state = agent.get_position()
     no_error_state = agent.get_position()
     true_pos = agent.get_position()
 
@@ -145,15 +196,9 @@ def run_simulation(render_sim, T, seed = None):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_q:
-                    show_particles = not show_particles
-                if event.key == pygame.K_w:
-                    show_ekf = not show_ekf
-                if event.key == pygame.K_e:
-                    show_grid = not show_grid
-                if event.key == pygame.K_r:
-                    show_asir = not show_asir
+            if event.type == pygame.KEYDOWN and event.key in toggle_keys:
+                name = toggle_keys[event.key]
+                shown[name] = not shown[name]
 
         now = pygame.time.get_ticks()
         # compute recursion at the discrete time interval
@@ -174,52 +219,9 @@ def run_simulation(render_sim, T, seed = None):
             z_k = distances + np.random.normal(0, sensor_noise, size=len(world.beacons))
             k += 1
 
-            start = time.perf_counter()
-            ekf.predict(mu, dt)
-            ekf.update(z_k)
-            ekf_mean.center = ekf.get_state()
-            ekf_time = time.perf_counter() - start
-
-            start = time.perf_counter()
-            pf.predict(mu, dt)
-            pf.update(z_k, world.beacons, sensor_noise)
-            pf_time = time.perf_counter() - start
-
-            start = time.perf_counter()
-            agf.predict(mu, dt)
-            agf.update(z_k, world.beacons, sensor_noise)
-            agf_time = time.perf_counter() - start
-
-            start = time.perf_counter()
-            asir.predict(mu, dt)
-            asir.update(z_k, world.beacons, sensor_noise)
-            asir_time = time.perf_counter() - start
-
-
-
-            # print(f"EKF: {ekf_time*1000:.2f}ms | PF: {pf_time*1000:.2f}ms | Grid: {agf_time*1000:.2f}ms")
-
-            # We resample if it drops below a threshold N_T as degeneracy is high
-            N_T = N_s // 1
-            if pf.effective_sample_size() < N_T:
-                pf.resample()
-            
-            # lets metric-ify the sim
-            ground_truth = true_pos
-            ekf_predicted_state = ekf.get_state()
-            pf_predicted_state = pf.get_estimated_state()
-            agf_predicted_state = agf.get_estimated_state()
-            asir_predicted_state = asir.get_estimated_state()
-            error_ekf  = np.linalg.norm(ground_truth - ekf_predicted_state)
-            error_agf  = np.linalg.norm(ground_truth - agf_predicted_state)
-            error_pf   = np.linalg.norm(ground_truth - pf_predicted_state)
-            error_asir = np.linalg.norm(ground_truth - asir_predicted_state)
-            error_true = np.linalg.norm(ground_truth - no_error_state)
-            error_list_ekf.append(error_ekf)
-            error_list_agf.append(error_agf)
-            error_list_pf.append(error_pf)
-            error_list_asir.append(error_asir)
-            error_list_true.append(error_true)
+            # every configured filter runs one timed recursion
+            harness.step(mu, dt, z_k, world.beacons, sensor_noise, true_pos)
+            error_list_true.append(np.linalg.norm(true_pos - no_error_state))
 
         # Draw environment
         world.draw(win, colors)
@@ -227,43 +229,9 @@ def run_simulation(render_sim, T, seed = None):
         glow_surface.fill((0, 0, 0, 0))
         grid_surface.fill((0, 0, 0, 0))  # clear every frame so toggling off removes it
 
-        if show_particles:
-            max_weight = max(p.weight for p in pf.particles) + 1e-6
-            for p in pf.particles:
-                normalized = p.weight / max_weight
-                size = int(1 + 5 * normalized)
-                pygame.draw.circle(glow_surface, (255, 80, 80, 130), (int(p.x), int(p.y)), size)
-            pygame.draw.circle(glow_surface, (255, 255, 0, 230), pf_predicted_state, dot_radius)
-
-        if show_grid:
-            render_grid(agf.get_grid())
-            pygame.draw.circle(glow_surface, (255, 0, 255, 230), agf_predicted_state, dot_radius)
-
-        if show_asir:
-            max_weight = max(p.weight for p in asir.particles) + 1e-6
-            for p in asir.particles:
-                normalized = p.weight / max_weight
-                size = int(1 + 5 * normalized)
-                pygame.draw.circle(glow_surface, (255, 140, 0, 130), (int(p.x), int(p.y)), size)
-            pygame.draw.circle(glow_surface, (255, 140, 0, 230), asir_predicted_state.astype(int), dot_radius)
-
-        if show_ekf:
-            pygame.draw.circle(glow_surface, (0, 255, 255, 230), ekf_mean.center, dot_radius)
-            sigma_x = np.sqrt(ekf.get_covariance()[0, 0])
-            sigma_y = np.sqrt(ekf.get_covariance()[1, 1])
-            radius_x = 2 * sigma_x
-            radius_y = 2 * sigma_y
-            pygame.draw.ellipse(
-                glow_surface,
-                (0, 255, 255, 38),
-                pygame.Rect(
-                    ekf.get_state()[0] - radius_x,
-                    ekf.get_state()[1] - radius_y,
-                    2 * radius_x,
-                    2 * radius_y
-                ),
-                width=0
-            )
+        for spec in specs:
+            if shown[spec.name]:
+                draw_filter(harness.filters[spec.name], spec, harness.estimates[spec.name])
 
         pygame.draw.line(glow_surface, (0, 150, 255, 55), world.beacons[0], true_pos, width=3)
         if num_beacons == 2:
@@ -283,10 +251,8 @@ def run_simulation(render_sim, T, seed = None):
         # HUD: toggle key legend
         hud_font = pygame.font.SysFont("monospace", 15)
         hud_lines = [
-            ("[Q] Particle filter (SIR)",   (255, 80,  80),  show_particles),
-            ("[W] Extended Kalman filter",   (0,   255, 255), show_ekf),
-            ("[E] Grid filter (AGF)",        (255, 0,   255), show_grid),
-            ("[R] ASIR particle filter",     (255, 140, 0),   show_asir),
+            (f"[{key.upper()}] {spec.label}", spec.color, shown[spec.name])
+            for key, spec in zip(_TOGGLE_KEYS, specs)
         ]
         pad_x, pad_y = 10, 10
         line_h = 20
@@ -304,32 +270,28 @@ def run_simulation(render_sim, T, seed = None):
 
     pygame.quit()
 
-    def compute_rmse(errors):
-        return np.sqrt(np.mean(np.square(errors)))
-    
-    rmse_ekf = compute_rmse(error_list_ekf)
-    rmse_pf = compute_rmse(error_list_pf)
-    rmse_agf = compute_rmse(error_list_agf)
-    rmse_asir = compute_rmse(error_list_asir)
-    rmse_true = compute_rmse(error_list_true)
+    for name, f in harness.filters.items():
+        if hasattr(f, "resampling_policy"):
+            stats = f.resampling_policy.summary()
+            print(f"{name.upper()} resampled {stats['fired']}/{stats['steps']} steps, "
+                  f"{stats['time_mean'] * 1000:.3f} ms each")
+    print(harness.finish_profile().report())
+
+    results = harness.rmse()
+    results["unfiltered"] = compute_rmse(error_list_true)
 
     def plot_results():
-        timesteps = list(range(len(error_list_ekf)))
+        import matplotlib.pyplot as plt
 
-        plt.plot(timesteps, error_list_ekf, label='extended kalman filter')
-        plt.plot(timesteps, error_list_pf, label='bootstrap particle filter')
-        plt.plot(timesteps, error_list_agf, label='grid-based filter')
-        plt.plot(timesteps, error_list_asir, label='ASIR particle filter', color='orange')
+        timesteps = list(range(len(error_list_true)))
+
+        for spec in specs:
+            plt.plot(timesteps, harness.errors[spec.name], label=spec.label,
+                     color=tuple(c / 255 for c in spec.color))
         plt.plot(timesteps, error_list_true, label='unaltered state (no filter)')
 
-        rmse_text = (
-            "RMSE: \n"
-            f"EKF  : {rmse_ekf:.2f}\n"
-            f"PF   : {rmse_pf:.2f}\n"
-            f"Grid : {rmse_agf:.2f}\n"
-            f"ASIR : {rmse_asir:.2f}\n"
-            f"Unaltered : {rmse_true:.2f}"
-        )
+        rmse_text = "RMSE: \n" + "\n".join(
+            f"{name.upper():<10}: {rmse:.2f}" for name, rmse in results.items())
 
         plt.gca().text(
             0.98, 0.02,
@@ -353,12 +315,7 @@ def run_simulation(render_sim, T, seed = None):
     if render_sim:
         plot_results()
 
-    return (
-        rmse_ekf,
-        rmse_pf,
-        rmse_agf,
-        rmse_asir,
-        rmse_true,
-    )
+    return results
 
-run_simulation(True, 600, None)
\ No newline at end of file
+if __name__ == "__main__":
+    run_simulation(True, 600, None)
@@ -2,24 +2,26 @@ import pygame
 import numpy as np
 import random
 import math
-from sim.world import World
+from sim.core import AgentCore
 
-class Agent:
+class Agent(AgentCore):
     def __init__(self, start_x, start_y, frame_rate, WIDTH, HEIGHT, radius=10, speed=5):
-        self.rect = pygame.Rect(start_x, start_y, radius * 2, radius * 2)
-        self.no_error_rect = pygame.Rect(start_x, start_y, radius * 2, radius * 2)
-        self.radius = radius
+        super().__init__(start_x, start_y, WIDTH, HEIGHT, radius)
         self.speed = speed
-        self.true_state = np.array([start_x, start_y], dtype=float)
         self.frame_rate = frame_rate
-        # for ornstein-uhlenbeck process make global variables
-        self.ou_x = -4.0
-        self.ou_y = -4.0
-        self.WIDTH = WIDTH
-        self.HEIGHT = HEIGHT
+
+    # pygame views of the state vector, for drawing and manual control
+    @property
+    def rect(self):
+        return pygame.Rect(int(self.state[0]), int(self.state[1]), self.size, self.size)
+
+    @property
+    def no_error_rect(self):
+        return pygame.Rect(int(self.state[2]), int(self.state[3]), self.size, self.size)
 
     def move(self, keys, world, mu, dt, manual_control):
         if manual_control is True:
+            rect = self.rect
             no_error_state = self.no_error_rect
 
             # control input [vx, vy]
@@ -40,7 +42,7 @@ class Agent:
             minor_uncertainty_y = random.gauss(0, 1)
 
             # --- Try moving X axis ---
-            x_rect = self.rect.copy()
+            x_rect = rect.copy()
             x_rect_no_error = no_error_state.copy()
             if keys[pygame.K_LEFT]:
                 x_rect.x -= self.speed * motion_uncertainty + min(0, self.ou_x) + minor_uncertainty_x
@@ -55,13 +57,13 @@ class Agent:
             within_bounds_x = 0 <= x_rect.left and x_rect.right <= self.WIDTH
             collision_x = world.collision(x_rect)
             if within_bounds_x and not collision_x:
-                self.rect.x = x_rect.x
+                rect.x = x_rect.x
                 no_error_state.x = x_rect_no_error.x
             else:
                 mu[0] *= 0.1
 
             # --- Try moving Y axis ---
-            y_rect = self.rect.copy()
+            y_rect = rect.copy()
             y_rect_no_error = no_error_state.copy()
             if keys[pygame.K_UP]:
                 y_rect.y -= self.speed * motion_uncertainty + self.ou_y + minor_uncertainty_y
@@ -75,73 +77,15 @@ class Agent:
             within_bounds_y = 0 <= y_rect.top and y_rect.bottom <= self.HEIGHT
             collision_y = world.collision(y_rect)
             if within_bounds_y and not collision_y:
-                self.rect.y = y_rect.y
+                rect.y = y_rect.y
                 no_error_state.y = y_rect_no_error.y
             else:
                 mu[1] *= 0.1
 
+            self.state[:] = (rect.x, rect.y, no_error_state.x, no_error_state.y)
             return mu, no_error_state.center
         else:
-            no_error_state = self.no_error_rect
-
-            # gravity — accelerates downward continuously (y increases downward in pygame)
-            gravity = 1600.0
-            mu[1] += gravity * dt
-
-            # general error in the system dynamics
-            motion_uncertainty = random.betavariate(3, 2)
-
-            # ornstein-uhlenbeck process for random direction drift
-            theta = 0.8
-            sigma = 280.0
-            self.ou_x = -theta * self.ou_x * dt + sigma * math.sqrt(dt) * random.gauss(0, 1)
-            self.ou_y = -theta * self.ou_y * dt + sigma * math.sqrt(dt) * random.gauss(0, 1)
-
-            minor_uncertainty_x = random.gauss(0, 5)
-            minor_uncertainty_y = random.gauss(0, 5)
-
-            # --- Try moving X axis ---
-            x_rect = self.rect.copy()
-            x_rect.x += (mu[0] * motion_uncertainty + self.ou_x + minor_uncertainty_x) * dt
-            no_error_state.x += mu[0] * dt
-
-            within_bounds_x = 0 <= x_rect.left and x_rect.right <= self.WIDTH
-            collision_x = world.collision(x_rect)
-            if within_bounds_x and not collision_x:
-                self.rect.x = x_rect.x
-            else:
-                no_error_state.x -= mu[0] * dt
-                mu[0] *= -1.0
-                speed = math.sqrt(mu[0] ** 2 + mu[1] ** 2)
-                new_angle = math.atan2(mu[1], mu[0]) + random.gauss(0, 0.18)
-                mu[0] = speed * math.cos(new_angle)
-                mu[1] = speed * math.sin(new_angle)
-                self.rect.x += (mu[0] * motion_uncertainty + self.ou_x + minor_uncertainty_x) * dt
-                no_error_state.x += mu[0] * dt
-
-            # --- Try moving Y axis ---
-            y_rect = self.rect.copy()
-            y_rect.y += (mu[1] * motion_uncertainty + self.ou_y + minor_uncertainty_y) * dt
-            no_error_state.y += mu[1] * dt
-
-            within_bounds_y = 0 <= y_rect.top and y_rect.bottom <= self.HEIGHT
-            collision_y = world.collision(y_rect)
-            if within_bounds_y and not collision_y:
-                self.rect.y = y_rect.y
-            else:
-                no_error_state.y -= mu[1] * dt
-                mu[1] *= -1.0
-                speed = math.sqrt(mu[0] ** 2 + mu[1] ** 2)
-                new_angle = math.atan2(mu[1], mu[0]) + random.gauss(0, 0.18)
-                mu[0] = speed * math.cos(new_angle)
-                mu[1] = speed * math.sin(new_angle)
-                self.rect.y += (mu[1] * motion_uncertainty + self.ou_y + minor_uncertainty_y) * dt
-                no_error_state.y += mu[1] * dt
-
-            return mu, no_error_state.center
+            return self.step(world, mu, dt)
 
-    def get_position(self):
-        return np.array([self.rect.x, self.rect.y])
-    
     def get_rect(self):
         return self.rect
@@ -0,0 +1,108 @@
+import numpy as np
+from sim.core import WALLS, DT, beacon_layout
+from sim.collision import OccupancyIndex
+
+# Batch-of-worlds simulator
+#
+# Steps B independent agents in lockstep, each in its own copy of the same
+# map, with every quantity held as an array over the batch: positions
+# (B, 4) as [x, y, x_nominal, y_nominal], control inputs mu (B, 2) and OU
+# drift (B, 2). One step is a fixed number of NumPy passes regardless of B,
+# so thousands of Monte-Carlo or training trajectories cost about as much
+# as a handful of single-agent runs.
+#
+# The dynamics are the autonomous (non-manual) branch of Agent.move /
+# AgentCore.step: gravity, Beta(3,2) motion noise, OU drift, per-axis wall
+# and bounds checks with reflection plus angle jitter. Random draws come
+# from a numpy Generator instead of the `random` module, so a batch run is
+# statistically equivalent to, not bit-identical with, B single-agent runs.
+
+
+class BatchSim:
+    def __init__(self, B, width=1200, height=800, num_beacons=1, start=(700, 250),
+                 radius=10, seed=None):
+        self.B = B
+        self.width = width
+        self.height = height
+        self.radius = radius
+        self.size = radius * 2
+        self.walls = WALLS.copy()
+        self.index = OccupancyIndex(self.walls, width, height)
+        self.beacons = beacon_layout(width, height, num_beacons).astype(float)
+        self.rng = np.random.default_rng(seed)
+
+        self.state = np.tile(np.array([*start, *start], dtype=float), (B, 1))
+        # for ornstein-uhlenbeck process
+        self.ou = np.full((B, 2), -4.0)
+
+        # initial state of mu: N(550, 80) speed in a uniform direction
+        speed = self.rng.normal(550, 80, B)
+        angle = self.rng.uniform(0, 2 * np.pi, B)
+        self.mu = np.column_stack((speed * np.cos(angle), speed * np.sin(angle)))
+
+    def _blocked(self, trial, axis):
+        # bounds are only checked along the axis being moved
+        limit = self.width if axis == 0 else self.height
+        out_of_bounds = (trial[:, axis] < 0) | (trial[:, axis] + self.size > limit)
+        return out_of_bounds | self.index.boxes_collide(trial[:, 0], trial[:, 1], self.size, self.size)
+
+    def step(self, dt=DT):
+        """Advance every agent one step. Returns (mu, nominal centres), both (B, 2)."""
+        B, s, mu, rng = self.B, self.state, self.mu, self.rng
+
+        # gravity — accelerates downward continuously (y increases downward on screen)
+        gravity = 1600.0
+        mu[:, 1] += gravity * dt
+
+        # general error in the system dynamics
+        motion_uncertainty = rng.beta(3, 2, B)
+
+        # ornstein-uhlenbeck process for random direction drift
+        theta = 0.8
+        sigma = 280.0
+        self.ou = -theta * self.ou * dt + sigma * np.sqrt(dt) * rng.standard_normal((B, 2))
+
+        minor_uncertainty = rng.normal(0, 5, (B, 2))
+
+        # try moving one axis at a time; on a hit, bounce with a small angular kick
+        for axis in (0, 1):
+            trial = s[:, :2].copy()
+            trial[:, axis] += (mu[:, axis] * motion_uncertainty + self.ou[:, axis]
+                               + minor_uncertainty[:, axis]) * dt
+            hit = self._blocked(trial, axis)
+
+            s[~hit, axis] = trial[~hit, axis]
+            if hit.any():
+                mu[hit, axis] *= -1.0
+                speed = np.hypot(mu[hit, 0], mu[hit, 1])
+                new_angle = np.arctan2(mu[hit, 1], mu[hit, 0]) + rng.normal(0, 0.18, hit.sum())
+                mu[hit, 0] = speed * np.cos(new_angle)
+                mu[hit, 1] = speed * np.sin(new_angle)
+                s[hit, axis] += (mu[hit, axis] * motion_uncertainty[hit] + self.ou[hit, axis]
+                                 + minor_uncertainty[hit, axis]) * dt
+            s[:, 2 + axis] += mu[:, axis] * dt
+
+        return mu, s[:, 2:] + self.radius
+
+    def positions(self):
+        return self.state[:, :2].copy()
+
+    def measure(self, sensor_std):
+        # noisy range from every agent to every beacon, (B, num_beacons)
+        distances = np.sqrt(((self.state[:, None, :2] - self.beacons) ** 2).sum(axis=-1))
+        return distances + self.rng.normal(0, sensor_std, distances.shape)
+
+    def rollout(self, T, sensor_std, dt=DT):
+        """Step T times and return (observations (B, T, m), controls (B, T, 3),
+        positions (B, T, 2)), in the layout train_neural_filter.py uses."""
+        m = len(self.beacons)
+        obs = np.empty((self.B, T, m))
+        ctrl = np.empty((self.B, T, 3))
+        pos = np.empty((self.B, T, 2))
+        for t in range(T):
+            mu, _ = self.step(dt)
+            pos[:, t] = self.state[:, :2]
+            obs[:, t] = self.measure(sensor_std)
+            ctrl[:, t, :2] = mu
+            ctrl[:, t, 2] = dt
+        return obs, ctrl, pos
@@ -0,0 +1,148 @@
+import math
+import random
+import numpy as np
+from sim.collision import OccupancyIndex
+
+# Headless simulation core
+#
+# Pure-NumPy version of the world and agent physics, with no pygame import.
+# Walls are axis-aligned boxes stored as rows of an (M, 4) array of
+# [x, y, w, h] and rasterized into an OccupancyIndex for collision
+# queries, and the agent is a state vector [x, y, x_nominal, y_nominal]
+# (top-left corner of its bounding box, plus the noise-free dead-reckoned
+# position). Time advances in fixed steps of dt, so a seeded run is fully
+# deterministic and goes as fast as the filters allow. The pygame World and
+# Agent in sim/world.py and sim/agent.py are thin render wrappers around
+# these classes.
+
+DT = 1.0 / 60.0  # fixed simulation step, seconds (one frame at 60 fps)
+
+_T = 18  # uniform wall thickness throughout
+
+WALLS = np.array([
+    # ── Left room ──────────────────────────────────────────────
+    ( 80, 100, 240,  _T),  # top wall
+    ( 80, 100,  _T, 320),  # left wall
+    ( 80, 400, 160,  _T),  # bottom wall  (door gap: right)
+    (300, 100,  _T, 190),  # right wall top (door gap: below)
+    (300, 330,  _T,  90),  # right wall bottom
+
+    # ── Top alcove (above center) ───────────────────────────────
+    (420,  60,  _T, 160),  # left wall
+    (420,  60, 200,  _T),  # top wall
+    (620,  60,  _T, 160),  # right wall
+
+    # ── Center pillar ───────────────────────────────────────────
+    (530, 240, 100, 100),
+
+    # ── Right corridor ──────────────────────────────────────────
+    (780, 100, 220,  _T),  # top wall
+    (780, 100,  _T, 200),  # left wall
+    (980, 100,  _T, 300),  # right wall
+    (840, 380, 160,  _T),  # bottom wall  (door gap: left)
+
+    # ── Lower-left barrier ──────────────────────────────────────
+    (120, 560, 200,  _T),
+    (120, 460,  _T, 100),
+
+    # ── Lower-right enclosure ───────────────────────────────────
+    ( 940, 420, 140,  _T),  # top
+    (1060, 420,  _T, 180),  # right
+    ( 880, 580, 200,  _T),  # bottom
+], dtype=float)
+
+
+def beacon_layout(width, height, num_beacons):
+    if num_beacons == 1:
+        return np.array([[width // 2, height // 2]])
+    elif num_beacons == 2:
+        return np.array([[width // 2, height // 2], [430, 220]])
+    else:
+        return np.array([[width // 2, height // 2], [430, 220], [1100, 250]])
+
+
+class WorldCore:
+    def __init__(self, width, height, num_beacons):
+        self.width = width
+        self.height = height
+        self.num_beacons = num_beacons
+        self.walls = WALLS.copy()
+        self.beacons = beacon_layout(width, height, num_beacons)
+        # O(1) point / box queries against the rasterized walls
+        self.index = OccupancyIndex(self.walls, width, height)
+
+    def collision(self, box):
+        # same test as pygame.Rect.colliderect against every wall
+        return self.index.boxes_collide(*box)
+
+    def measure(self, position, sensor_std):
+        # noisy range to every beacon
+        distances = np.linalg.norm(self.beacons - position, axis=1)
+        return distances + np.random.normal(0, sensor_std, size=len(self.beacons))
+
+
+class AgentCore:
+    def __init__(self, start_x, start_y, WIDTH, HEIGHT, radius=10):
+        # [x, y, x_nominal, y_nominal]
+        self.state = np.array([start_x, start_y, start_x, start_y], dtype=float)
+        self.radius = radius
+        self.size = radius * 2
+        # for ornstein-uhlenbeck process make global variables
+        self.ou_x = -4.0
+        self.ou_y = -4.0
+        self.WIDTH = WIDTH
+        self.HEIGHT = HEIGHT
+
+    def _blocked(self, world, trial, axis):
+        # bounds are only checked along the axis being moved
+        limit = self.WIDTH if axis == 0 else self.HEIGHT
+        within_bounds = 0 <= trial[axis] and trial[axis] + self.size <= limit
+        return not within_bounds or world.collision((trial[0], trial[1], self.size, self.size))
+
+    def step(self, world, mu, dt):
+        """Advance one autonomous step. Updates mu in place and returns
+        (mu, nominal centre)."""
+        s = self.state
+
+        # gravity — accelerates downward continuously (y increases downward on screen)
+        gravity = 1600.0
+        mu[1] += gravity * dt
+
+        # general error in the system dynamics
+        motion_uncertainty = random.betavariate(3, 2)
+
+        # ornstein-uhlenbeck process for random direction drift
+        theta = 0.8
+        sigma = 280.0
+        self.ou_x = -theta * self.ou_x * dt + sigma * math.sqrt(dt) * random.gauss(0, 1)
+        self.ou_y = -theta * self.ou_y * dt + sigma * math.sqrt(dt) * random.gauss(0, 1)
+        ou = (self.ou_x, self.ou_y)
+
+        minor_uncertainty = (random.gauss(0, 5), random.gauss(0, 5))
+
+        # try moving one axis at a time; on a hit, bounce with a small angular kick
+        for axis in (0, 1):
+            trial = s[:2].copy()
+            trial[axis] += (mu[axis] * motion_uncertainty + ou[axis] + minor_uncertainty[axis]) * dt
+
+            if not self._blocked(world, trial, axis):
+                s[axis] = trial[axis]
+            else:
+                mu[axis] *= -1.0
+                speed = math.sqrt(mu[0] ** 2 + mu[1] ** 2)
+                new_angle = math.atan2(mu[1], mu[0]) + random.gauss(0, 0.18)
+                mu[0] = speed * math.cos(new_angle)
+                mu[1] = speed * math.sin(new_angle)
+                s[axis] += (mu[axis] * motion_uncertainty + ou[axis] + minor_uncertainty[axis]) * dt
+            s[2 + axis] += mu[axis] * dt
+
+        return mu, self.get_nominal_center()
+
+    def get_position(self):
+        return self.state[:2].copy()
+
+    def get_center(self):
+        return self.state[:2] + self.radius
+
+    def get_nominal_center(self):
+        return self.state[2:] + self.radius
@@ -0,0 +1,95 @@
+import time
+import tracemalloc
+import numpy as np
+from filters.registry import Filter
+from sim.profiling import FilterProfile, StageProfiler, peak_rss_bytes
+
+# Filter harness
+#
+# Runs any set of filters that follow filters.registry.Filter through one
+# recursion per step, timing each stage (predict, update, resample, estimate)
+# into per-filter latency histograms and recording each estimate and its
+# distance from the ground truth. Rendering and benchmarking both drive their
+# filters through it, so neither needs per-filter bookkeeping.
+#
+# track_memory=True also records, per filter, the largest transient
+# allocation of any one step (tracemalloc; adds noticeable overhead until
+# finish_profile() stops it).
+# profile_filter=name wraps every stage of that one filter in cProfile.
+
+
+def compute_rmse(errors):
+    return np.sqrt(np.mean(np.square(errors))) if len(errors) else float("nan")
+
+
+class FilterHarness:
+    def __init__(self, filters: dict[str, Filter], track_memory=False, profile_filter=None):
+        self.filters = filters  # {name: filter}, run in insertion order
+        self.estimates = {name: None for name in filters}
+        self.errors = {name: [] for name in filters}
+        self.profile = FilterProfile(filters)
+        self.track_memory = track_memory
+        # only stop tracing in finish_profile if this harness started it
+        self._started_tracing = track_memory and not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+        if profile_filter is not None and profile_filter not in filters:
+            raise ValueError(
+                f"cannot profile {profile_filter!r}; expected one of {list(filters)}"
+            )
+        self.profiler = StageProfiler(profile_filter) if profile_filter is not None else None
+
+    def step(self, mu, dt, z_k, beacon_positions, sensor_std, true_pos):
+        for name, f in self.filters.items():
+            latency = self.profile.latency[name]
+            profiler = self.profiler.profiler if self.profiler and self.profiler.name == name else None
+            if self.track_memory:
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+            if profiler is not None:
+                profiler.enable()
+
+            t0 = time.perf_counter()
+            f.predict(mu, dt)
+            t1 = time.perf_counter()
+            f.update(z_k, beacon_positions, sensor_std)
+            t2 = time.perf_counter()
+            # particle filters resample only when their policy says so
+            if hasattr(f, "maybe_resample"):
+                f.maybe_resample()
+            t3 = time.perf_counter()
+            estimate = f.get_estimated_state()
+            t4 = time.perf_counter()
+
+            if profiler is not None:
+                profiler.disable()
+            if self.track_memory:
+                peak = tracemalloc.get_traced_memory()[1] - base
+                self.profile.peak_alloc[name] = max(self.profile.peak_alloc[name], peak)
+
+            latency["predict"].add(t1 - t0)
+            latency["update"].add(t2 - t1)
+            if hasattr(f, "maybe_resample"):
+                latency["resample"].add(t3 - t2)
+            latency["estimate"].add(t4 - t3)
+            latency["step"].add(t4 - t0)
+
+            self.estimates[name] = estimate
+            self.errors[name].append(np.linalg.norm(true_pos - estimate))
+
+    def rmse(self):
+        return {name: compute_rmse(errors) for name, errors in self.errors.items()}
+
+    def finish_profile(self):
+        """The run's FilterProfile, stamped with the process's peak RSS.
+
+        Ends memory tracking: tracemalloc is stopped if this harness started it.
+        """
+        self.profile.peak_rss = peak_rss_bytes()
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        self.track_memory = False
+        if self.profiler is not None:
+            self.profile.cprofile = f"cProfile of {self.profiler.name}:\n" + self.profiler.stats()
+        return self.profile
@@ -0,0 +1,128 @@
+import math
+import random
+import numpy as np
+from filters.registry import FilterConfig, DEFAULT_FILTERS, build_filters
+from filters.map_constraint import MapConstraint
+from sim.core import WorldCore, AgentCore, DT
+from sim.harness import FilterHarness, compute_rmse
+from sim.recording import TrajectoryRecorder
+
+# Headless filter comparison
+#
+# Same filter loop as main.run_simulation, driven by the pygame-free core
+# with a fixed step dt instead of the wall clock. Nothing is drawn, so a run
+# costs only the physics and the filters themselves, and a given seed always
+# reproduces the same trajectory.
+#
+# run_headless(record_to=path) also writes the run to a sim.recording
+# directory, and run_replay feeds a recorded run to the filters without
+# simulating it again, so filters can be compared on a fixed corpus.
+# Recordings hold agent centres; the filters, the sensor and MapConstraint
+# work on the agent's top-left corner, which replay recovers from box_size.
+
+WIDTH, HEIGHT = 1200, 800
+
+
+def _make_harness(world, start, box_size, sensor_noise, filters, N_s=120, grid_resolution=15,
+                  grid_predict_mode="exact", grid_sparse=False, map_aware=False,
+                  adaptive_particles=False, N_min=20, N_max=None, resampling_mode="ess",
+                  neural_variant="eager", grid_parallel=False, grid_threads=None, dtype=np.float64,
+                  track_memory=False, profile_filter=None):
+    config = FilterConfig(
+        world.width, world.height, world.beacons, start, sensor_noise, N_s=N_s,
+        grid_resolution=grid_resolution, grid_predict_mode=grid_predict_mode, grid_sparse=grid_sparse,
+        # zero weight for states inside walls, penalty for passing through one
+        map_constraint=MapConstraint(world.index, box_size=box_size) if map_aware else None,
+        adaptive_particles=adaptive_particles, N_min=N_min, N_max=N_max,
+        resampling_mode=resampling_mode,
+        neural_variant=neural_variant, grid_parallel=grid_parallel, grid_threads=grid_threads,
+        dtype=dtype,
+    )
+    return FilterHarness(build_filters(filters, config), track_memory=track_memory,
+                         profile_filter=profile_filter)
+
+
+def _finish(harness, unfiltered_errors, return_profile):
+    results = harness.rmse()
+    results["unfiltered"] = compute_rmse(unfiltered_errors)
+    # always finished, so memory tracking stops even if the profile is dropped
+    profile = harness.finish_profile()
+    if return_profile:
+        return results, profile
+    return results
+
+
+def run_headless(T, seed=None, dt=DT, filters=DEFAULT_FILTERS, sensor_noise=30.0, num_beacons=1,
+                 record_to=None, return_profile=False, **options):
+    """Run the named filters for T steps; returns {name: RMSE} plus "unfiltered".
+
+    With return_profile=True returns (results, FilterProfile) instead; see
+    sim.harness for the track_memory and profile_filter options. Remaining
+    options (N_s, grid_*, map_aware, ...) configure the filters.
+    """
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+
+    # initial state of mu
+    initial_velocity = random.gauss(550, 80)
+    angle = random.uniform(0, 2 * math.pi)
+    mu = np.array([initial_velocity * math.cos(angle), initial_velocity * math.sin(angle)])
+
+    world = WorldCore(WIDTH, HEIGHT, num_beacons)
+    agent = AgentCore(start_x=700, start_y=250, WIDTH=WIDTH, HEIGHT=HEIGHT, radius=10)
+    start = agent.get_position()
+    harness = _make_harness(world, start, agent.size, sensor_noise, filters, **options)
+    recorder = None
+    if record_to is not None:
+        recorder = TrajectoryRecorder(record_to, T, world.beacons, width=WIDTH, height=HEIGHT,
+                                      start=agent.get_center().tolist(), box_size=agent.size,
+                                      sensor_noise=sensor_noise, seed=seed)
+
+    error_list_true = list()
+
+    for k in range(T):
+        mu, no_error_state = agent.step(world, mu, dt)
+
+        # Sensor measurement
+        true_pos = agent.get_position()
+        z_k = world.measure(true_pos, sensor_noise)
+        center = agent.get_center()
+
+        if recorder is not None:
+            recorder.record(center, no_error_state, mu, dt, z_k)
+        harness.step(mu, dt, z_k, world.beacons, sensor_noise, true_pos)
+        # no_error_state is the nominal centre, so compare centres
+        error_list_true.append(np.linalg.norm(center - no_error_state))
+
+    if recorder is not None:
+        recorder.close()
+    return _finish(harness, error_list_true, return_profile)
+
+
+def run_replay(trajectory, seed=None, filters=DEFAULT_FILTERS, return_profile=False, **options):
+    """Run the named filters over a recorded sim.recording.Trajectory.
+
+    Returns the same results as run_headless. The seed only drives the
+    filters' own randomness, so results match the live run statistically
+    rather than bit for bit.
+    """
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+
+    meta = trajectory.meta
+    world = WorldCore(meta["width"], meta["height"], len(trajectory.beacons))
+    world.beacons = trajectory.beacons
+    sensor_noise = meta["sensor_noise"]
+    # recorded positions are centres; the filters track the top-left corner
+    corner = meta["box_size"] / 2
+    harness = _make_harness(world, np.array(meta["start"]) - corner, meta["box_size"], sensor_noise,
+                            filters, **options)
+
+    true_pos, mu, dt, z = trajectory.true_pos, trajectory.mu, trajectory.dt, trajectory.z
+    for k in range(len(trajectory)):
+        harness.step(mu[k], float(dt[k]), z[k], world.beacons, sensor_noise, true_pos[k] - corner)
+
+    error_list_true = np.linalg.norm(true_pos - trajectory.nominal, axis=1)
+    return _finish(harness, error_list_true, return_profile)
@@ -0,0 +1,123 @@
+import cProfile
+import io
+import pstats
+import resource
+import sys
+import numpy as np
+
+# Latency and memory instrumentation for the filter harness.
+#
+# LatencyHistogram buckets durations on a fixed log scale (1 us to 100 s,
+# BINS_PER_DECADE buckets per decade), so it costs O(1) per sample, has a
+# fixed size, and histograms from separate runs or worker processes merge
+# by adding counts. Percentiles are read from the cumulative counts, exact
+# to within one bucket (~12% at 20 buckets per decade); the max is exact.
+
+BINS_PER_DECADE = 20
+_MIN_EXP, _MAX_EXP = -6, 2
+_EDGES = np.logspace(_MIN_EXP, _MAX_EXP, (_MAX_EXP - _MIN_EXP) * BINS_PER_DECADE + 1)
+
+STAGES = ("predict", "update", "resample", "estimate", "step")
+
+
+class LatencyHistogram:
+    def __init__(self):
+        # bucket 0 is below 1 us, the last bucket is above 100 s
+        self.counts = np.zeros(len(_EDGES) + 1, dtype=np.int64)
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[np.searchsorted(_EDGES, seconds, side="right")] += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def n(self):
+        return int(self.counts.sum())
+
+    def percentile(self, q):
+        n = self.n
+        if n == 0:
+            return 0.0
+        k = int(np.searchsorted(np.cumsum(self.counts), q / 100 * n))
+        # report the bucket's upper edge, capped by the exact max
+        upper = _EDGES[min(k, len(_EDGES) - 1)]
+        return min(upper, self.max)
+
+    def summary(self):
+        n = self.n
+        return {
+            "n": n,
+            "mean": self.total / n if n else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+def peak_rss_bytes():
+    # process-wide resident-set high-water mark (ru_maxrss is KiB on Linux, bytes on macOS)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class FilterProfile:
+    """Per-filter, per-stage latency histograms plus memory high-water marks."""
+
+    def __init__(self, names):
+        self.latency = {name: {stage: LatencyHistogram() for stage in STAGES} for name in names}
+        self.peak_alloc = {name: 0 for name in names}  # bytes, from tracemalloc
+        self.peak_rss = 0
+        self.cprofile = None  # text report from StageProfiler, if one was attached
+
+    def merge(self, other):
+        for name, stages in other.latency.items():
+            mine = self.latency.setdefault(name, {stage: LatencyHistogram() for stage in STAGES})
+            for stage, hist in stages.items():
+                mine[stage].merge(hist)
+        for name, peak in other.peak_alloc.items():
+            self.peak_alloc[name] = max(self.peak_alloc.get(name, 0), peak)
+        self.peak_rss = max(self.peak_rss, other.peak_rss)
+        # cProfile output is not additive as text; keep the first run's
+        if self.cprofile is None:
+            self.cprofile = other.cprofile
+        return self
+
+    def report(self):
+        lines = [f"{'filter':<8}{'stage':<10}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}"
+                 f"{'p99 ms':>10}{'max ms':>10}"]
+        for name, stages in self.latency.items():
+            for stage, hist in stages.items():
+                s = hist.summary()
+                if s["n"] == 0:
+                    continue
+                lines.append(f"{name:<8}{stage:<10}{s['n']:>7}{s['p50'] * 1e3:>10.3f}"
+                             f"{s['p95'] * 1e3:>10.3f}{s['p99'] * 1e3:>10.3f}{s['max'] * 1e3:>10.3f}")
+            if self.peak_alloc.get(name):
+                lines.append(f"{name:<8}{'peak alloc':<10}{self.peak_alloc[name] / 2**20:>17.2f} MiB")
+        lines.append(f"peak RSS {self.peak_rss / 2**20:.1f} MiB")
+        if self.cprofile:
+            lines.append(self.cprofile)
+        return "\n".join(lines)
+
+
+class StageProfiler:
+    """cProfile hook around every stage of one filter."""
+
+    def __init__(self, name):
+        self.name = name
+        self.profiler = cProfile.Profile()
+
+    def stats(self, sort="cumulative", limit=25):
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
@@ -0,0 +1,94 @@
+import json
+import os
+import numpy as np
+
+# Trajectory recording
+#
+# A recorded run is a directory holding one .npy file per column plus a
+# meta.json:
+#
+#   true_pos.npy  (T, 2)  agent center with process noise (ground truth)
+#   nominal.npy   (T, 2)  noise-free dead-reckoned center ("unfiltered")
+#   mu.npy        (T, 2)  control velocity fed to predict
+#   dt.npy        (T,)    step length
+#   z.npy         (T, M)  range measurement to each of the M beacons
+#   beacons.npy   (M, 2)
+#
+# Columns are written through np.lib.format.open_memmap and read back with
+# mmap_mode="r", so a corpus far larger than RAM can be replayed and only the
+# pages a filter actually touches are loaded. meta.json carries the world
+# size, start centre, agent box size, sensor noise, seed and the number of
+# steps actually written. Positions are agent centres; subtract box_size / 2
+# for the top-left corner that Agent.get_position() and the filters use.
+
+COLUMNS = ("true_pos", "nominal", "mu", "dt", "z")
+
+
+class TrajectoryRecorder:
+    def __init__(self, path, T, beacons, **meta):
+        self.path = path
+        self.T = T
+        self.n = 0
+        self.meta = meta
+        beacons = np.asarray(beacons, dtype=float)
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "beacons.npy"), beacons)
+        shapes = {"true_pos": (T, 2), "nominal": (T, 2), "mu": (T, 2), "dt": (T,),
+                  "z": (T, len(beacons))}
+        self.columns = {
+            name: np.lib.format.open_memmap(os.path.join(path, name + ".npy"), mode="w+",
+                                            dtype=np.float64, shape=shapes[name])
+            for name in COLUMNS
+        }
+
+    def record(self, true_pos, nominal, mu, dt, z_k):
+        if self.n >= self.T:
+            raise ValueError(f"recorder is full ({self.T} steps)")
+        k = self.n
+        self.columns["true_pos"][k] = true_pos
+        self.columns["nominal"][k] = nominal
+        self.columns["mu"][k] = mu
+        self.columns["dt"][k] = dt
+        self.columns["z"][k] = z_k
+        self.n += 1
+
+    def close(self):
+        for column in self.columns.values():
+            column.flush()
+        self.columns = {}
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(dict(self.meta, n_steps=self.n), f, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Trajectory:
+    """A recorded run; columns are (read-only memory maps of) the .npy files."""
+
+    def __init__(self, path, mmap=True):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        n = self.meta["n_steps"]
+        mode = "r" if mmap else None
+        for name in COLUMNS:
+            # columns may be preallocated past the steps actually written
+            setattr(self, name, np.load(os.path.join(path, name + ".npy"), mmap_mode=mode)[:n])
+        self.beacons = np.load(os.path.join(path, "beacons.npy"))
+
+    def __len__(self):
+        return self.meta["n_steps"]
+
+
+def load_trajectory(path, mmap=True):
+    return Trajectory(path, mmap=mmap)
+
+
+def list_trajectories(directory):
+    """Recorded runs directly under directory, in name order."""
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if os.path.isfile(os.path.join(directory, name, "meta.json"))]
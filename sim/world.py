@@ -1,5 +1,5 @@
 import pygame
-import numpy as np
+from sim.core import WorldCore
 
 _WALL_BODY      = ( 52,  62,  72)
 _WALL_HIGHLIGHT = ( 78,  92, 108)
@@ -10,52 +10,11 @@ _BEACON_MID     = (  0, 150, 220)
 _BEACON_CORE    = (  0, 190, 255)
 _BEACON_INNER   = (180, 230, 255)
 
-class World:
+class World(WorldCore):
     def __init__(self, width, height, num_beacons):
-        self.width = width
-        self.height = height
-        self.num_beacons = num_beacons
-
-        T = 18  # uniform wall thickness throughout
-
-        self.obstacles = [
-            # ── Left room ──────────────────────────────────────────────
-            pygame.Rect( 80, 100, 240,   T),  # top wall
-            pygame.Rect( 80, 100,   T, 320),  # left wall
-            pygame.Rect( 80, 400, 160,   T),  # bottom wall  (door gap: right)
-            pygame.Rect(300, 100,   T, 190),  # right wall top (door gap: below)
-            pygame.Rect(300, 330,   T,  90),  # right wall bottom
-
-            # ── Top alcove (above center) ───────────────────────────────
-            pygame.Rect(420,  60,   T, 160),  # left wall
-            pygame.Rect(420,  60, 200,   T),  # top wall
-            pygame.Rect(620,  60,   T, 160),  # right wall
-
-            # ── Center pillar ───────────────────────────────────────────
-            pygame.Rect(530, 240, 100, 100),
-
-            # ── Right corridor ──────────────────────────────────────────
-            pygame.Rect(780, 100, 220,   T),  # top wall
-            pygame.Rect(780, 100,   T, 200),  # left wall
-            pygame.Rect(980, 100,   T, 300),  # right wall
-            pygame.Rect(840, 380, 160,   T),  # bottom wall  (door gap: left)
-
-            # ── Lower-left barrier ──────────────────────────────────────
-            pygame.Rect(120, 560, 200,   T),
-            pygame.Rect(120, 460,   T, 100),
-
-            # ── Lower-right enclosure ───────────────────────────────────
-            pygame.Rect(940, 420, 140,   T),  # top
-            pygame.Rect(1060, 420,  T, 180),  # right
-            pygame.Rect(880, 580, 200,   T),  # bottom
-        ]
-
-        if num_beacons == 1:
-            self.beacons = np.array([[width // 2, height // 2]])
-        elif num_beacons == 2:
-            self.beacons = np.array([[width // 2, height // 2], [430, 220]])
-        else:
-            self.beacons = np.array([[width // 2, height // 2], [430, 220], [1100, 250]])
+        super().__init__(width, height, num_beacons)
+        # pygame views of the wall boxes, for drawing
+        self.obstacles = [pygame.Rect(*map(int, wall)) for wall in self.walls]
 
     def draw(self, win, colors):
         # Subtle dot grid over the filled background
@@ -84,4 +43,7 @@ class World:
             pygame.draw.line(win, _BEACON_CORE, (bx, by + 10), (bx, by + 22), 1)
 
     def collision(self, rect):
-        return any(rect.colliderect(obs) for obs in self.obstacles)
+        # accepts a pygame.Rect or an (x, y, w, h) box
+        if isinstance(rect, pygame.Rect):
+            rect = (rect.x, rect.y, rect.w, rect.h)
+        return super().collision(rect)
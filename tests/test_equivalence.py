@@ -0,0 +1,113 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from filters.agf import AGF, predict_separable, predict_fft
+from filters.upf import UnscentedParticleFilter
+from sim.collision import OccupancyIndex
+from sim.core import WALLS
+
+# The fast paths added for performance must agree with the reference
+# implementations they replace: the batched UPF proposal with the
+# per-particle UKF loop, the separable and FFT AGF prediction with the exact
+# window sum, the multi-threaded AGF kernels with the single-threaded ones,
+# and the occupancy-grid collision index with pygame.Rect.colliderect.
+
+WIDTH, HEIGHT = 1200, 800
+
+
+# ---------------------------------------------------------------------------
+# UPF
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize("beacons", [[(600, 400)], [(600, 400), (100, 700)],
+                                     [(600, 400), (100, 700), (1100, 50)]])
+def test_upf_batched_proposal_matches_per_particle(beacons):
+    rng = np.random.default_rng(0)
+    upf = UnscentedParticleFilter(64, WIDTH, HEIGHT)
+    upf.predict([420.0, -310.0], 1 / 60)
+    X_prev = np.column_stack((upf.x, upf.y))
+    z_k = rng.uniform(50, 600, len(beacons))
+
+    mu_b, P_b = upf._ukf_proposal_batched(X_prev, z_k, beacons, 30.0)
+    for i, x_prev in enumerate(X_prev):
+        mu_i, P_i = upf._ukf_proposal(x_prev, z_k, beacons, 30.0)
+        np.testing.assert_allclose(mu_b[i], mu_i, rtol=1e-9, atol=1e-7)
+        np.testing.assert_allclose(P_b[i], P_i, rtol=1e-9, atol=1e-7)
+
+
+def test_upf_batched_update_matches_per_particle_statistically():
+    # the two paths draw their samples differently, so compare the posterior
+    # estimate rather than individual particles
+    beacons = [(600, 400)]
+    estimates = {}
+    for batched in (True, False):
+        np.random.seed(1)
+        upf = UnscentedParticleFilter(400, WIDTH, HEIGHT, batched=batched)
+        upf.predict([300.0, 200.0], 1 / 60)
+        upf.update([250.0], beacons, 30.0)
+        estimates[batched] = upf.get_estimated_state()
+        assert np.isclose(upf.weights.sum(), 1.0)
+    assert np.linalg.norm(estimates[True] - estimates[False]) < 15.0
+
+
+# ---------------------------------------------------------------------------
+# AGF prediction
+# ---------------------------------------------------------------------------
+
+def _agf_after_update(res, **options):
+    np.random.seed(2)
+    agf = AGF(WIDTH, HEIGHT, res, [700, 250], **options)
+    # a ring-shaped posterior like the one a single range beacon produces
+    agf.update([300.0], [(600, 400)], 30.0)
+    return agf
+
+
+@pytest.mark.parametrize("predict", [predict_separable, predict_fft])
+@pytest.mark.parametrize("mu", [(0.0, 0.0), (420.0, -310.0), (-900.0, 650.0)])
+def test_agf_convolution_predict_matches_exact(predict, mu):
+    agf = _agf_after_update(15)
+    weights = agf.weights.copy()
+    exact = agf._jit.predict_jit(weights, agf.xs, agf.ys, np.asarray(mu), 1 / 60, agf.res)
+    # the exact window stops at |mu| dt / res + 3 cells and the convolution
+    # kernels at 3 sigma, so only the truncated Gaussian tails differ
+    fast = predict(weights, mu, 1 / 60, agf.res)
+    assert np.abs(fast - exact).sum() < 5e-3
+    np.testing.assert_allclose(fast.sum(), 1.0)
+
+
+@pytest.mark.parametrize("mu", [(0.0, 0.0), (420.0, -310.0), (-900.0, 650.0)])
+def test_agf_parallel_predict_matches_exact(mu):
+    exact = _agf_after_update(15)
+    parallel = _agf_after_update(15, parallel=True)
+    exact.predict(mu, 1 / 60)
+    parallel.predict(mu, 1 / 60)
+    np.testing.assert_allclose(parallel.weights, exact.weights, rtol=1e-9, atol=1e-15)
+    np.testing.assert_allclose(parallel.get_estimated_state(), exact.get_estimated_state(),
+                               rtol=1e-9)
+
+
+# ---------------------------------------------------------------------------
+# Collision
+# ---------------------------------------------------------------------------
+
+def test_occupancy_index_matches_pygame_colliderect():
+    pygame = pytest.importorskip("pygame")
+    index = OccupancyIndex(WALLS, WIDTH, HEIGHT)
+    rects = [pygame.Rect(w) for w in WALLS]
+
+    rng = np.random.default_rng(3)
+    n = 5000
+    x = rng.integers(-40, WIDTH + 40, n)
+    y = rng.integers(-40, HEIGHT + 40, n)
+    # zero-size boxes included: pygame treats them as empty, and so does the index
+    w = rng.integers(0, 80, n)
+    h = rng.integers(0, 80, n)
+
+    expected = np.array([any(pygame.Rect(*box).colliderect(r) for r in rects)
+                         for box in zip(x.tolist(), y.tolist(), w.tolist(), h.tolist())])
+    np.testing.assert_array_equal(index.boxes_collide(x, y, w, h), expected)
+    assert expected.any() and not expected.all()
@@ -0,0 +1,26 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from filters.registry import FilterConfig, build_filters
+
+WIDTH, HEIGHT = 1200, 800
+
+
+@pytest.mark.parametrize("name", ["pf", "asir", "upf"])
+def test_kld_grows_particle_count_for_wide_posterior(name):
+    # one range beacon leaves a ring-shaped posterior spread over the 400 px
+    # start box, which needs far more than the 100 starting particles
+    np.random.seed(0)
+    config = FilterConfig(WIDTH, HEIGHT, [(600, 400)], np.array([700.0, 250.0]), 30.0,
+                          N_s=100, adaptive_particles=True, N_min=20, N_max=2000)
+    f = build_filters([name], config)[name]
+    assert f.N_max == 2000
+    f.predict([300.0, 0.0], 1 / 60)
+    f.update([300.0], [(600, 400)], 30.0)
+    f.resample()
+    assert f.N_s > 300
+    assert len(f.x) == len(f.weights) == f.N_s
@@ -0,0 +1,32 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from filters.agf import AGF
+from filters.map_constraint import MapConstraint
+from sim.collision import OccupancyIndex
+from sim.core import WALLS
+
+WIDTH, HEIGHT = 1200, 800
+BOX_SIZE = 20
+
+
+@pytest.mark.parametrize("res", [10, 15, 20])
+def test_free_mask_never_masks_a_valid_agent_position(res):
+    constraint = MapConstraint(OccupancyIndex(WALLS, WIDTH, HEIGHT), box_size=BOX_SIZE)
+    agf = AGF(WIDTH, HEIGHT, res, [700, 250], map_constraint=constraint)
+    mask = agf._free
+
+    rng = np.random.default_rng(0)
+    positions = rng.integers(0, [WIDTH - BOX_SIZE, HEIGHT - BOX_SIZE], (20000, 2)).astype(float)
+    valid = positions[~constraint.occupied(positions)]
+    i = (valid[:, 1] // res).astype(int)
+    j = (valid[:, 0] // res).astype(int)
+    inside = (i < mask.shape[0]) & (j < mask.shape[1])
+    assert np.all(mask[i[inside], j[inside]] == 1.0)
+
+    # cells deep inside walls are still removed
+    assert 0 < np.count_nonzero(mask == 0) < mask.size
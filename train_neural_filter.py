@@ -1,142 +1,279 @@
 """
 Train the LSTM-based neural filter.
 
-Generates synthetic trajectories by running the sim physics headlessly,
-then trains a 2-layer LSTM to predict position from noisy range measurements
-and control inputs. Saves weights to filters/neural_filter_weights.pt.
+Generates synthetic trajectories with the batched sim core in parallel
+worker processes, caches them to disk as memory-mapped shards, and trains a
+2-layer LSTM on streamed mini-batches of truncated sequences to predict
+position from noisy range measurements and control inputs. Saves weights to
+filters/neural_filter_weights.pt.
 
 Usage:
-    py -3.12 train_neural_filter.py
+    py -3.12 train_neural_filter.py [--episodes N] [--data-dir DIR] ...
 """
 
-import os, sys, math, random
+import os, sys, json, argparse
 import numpy as np
-
-# headless pygame — must be set before any pygame import
-os.environ["SDL_VIDEODRIVER"] = "dummy"
-import pygame
-pygame.init()
-pygame.display.set_mode((1200, 800))
+from multiprocessing import Pool
 
 sys.path.insert(0, os.path.dirname(__file__))
 
-from sim.world import World
-from sim.agent import Agent
+from sim.batch import BatchSim
 from filters.neural_filter import (
-    _LSTMFilter, WEIGHTS_PATH,
+    _LSTMFilter, _StepModel, WEIGHTS_PATH, SCRIPTED_PATH, QUANTIZED_PATH, ONNX_PATH,
     INPUT_SIZE, HIDDEN_SIZE, NUM_LAYERS,
     RANGE_SCALE, MU_SCALE, DT_SCALE,
 )
 
 import torch
 import torch.nn as nn
+from torch.utils.data import DataLoader, IterableDataset, get_worker_info
 
 WIDTH       = 1200
 HEIGHT      = 800
 NUM_BEACONS = 1
 SENSOR_NOISE = 30.0
-DT          = 1.0 / 60.0
+DATA_DIR    = os.path.join(os.path.dirname(__file__), "data", "neural_filter")
 
 
 # ---------------------------------------------------------------------------
 # Data generation
 # ---------------------------------------------------------------------------
 
-def collect_trajectory(T: int, seed: int):
-    random.seed(seed)
-    np.random.seed(seed)
-
-    world = World(WIDTH, HEIGHT, NUM_BEACONS)
-    agent = Agent(start_x=700, start_y=250, frame_rate=60,
-                  WIDTH=WIDTH, HEIGHT=HEIGHT, radius=10, speed=11)
-
-    speed = random.gauss(550, 80)
-    angle = random.uniform(0, 2 * math.pi)
-    mu    = np.array([speed * math.cos(angle), speed * math.sin(angle)])
-
-    fake_keys = {}   # non-manual branch of agent.move() never reads keys
-
-    obs_seq, ctrl_seq, pos_seq = [], [], []
-
-    for _ in range(T):
-        mu, _ = agent.move(fake_keys, world, mu, DT, manual_control=False)
-        true_pos = agent.get_position().astype(float)
-
-        deltas    = world.beacons - true_pos
-        distances = np.linalg.norm(deltas, axis=1)
-        z_k       = distances + np.random.normal(0, SENSOR_NOISE, size=NUM_BEACONS)
-
-        obs_seq.append(z_k.copy())
-        ctrl_seq.append(np.array([mu[0], mu[1], DT]))
-        pos_seq.append(true_pos.copy())
-
-    return np.array(obs_seq), np.array(ctrl_seq), np.array(pos_seq)
+def _features(obs, ctrl, pos):
+    """Normalized network inputs (B, T, 4) and targets (B, T, 2), float32."""
+    x = np.concatenate([obs / RANGE_SCALE,
+                        ctrl[..., :2] / MU_SCALE,
+                        ctrl[..., 2:] / DT_SCALE], axis=-1)   # dt column is 1.0 (fixed DT)
+    y = pos / np.array([WIDTH, HEIGHT])
+    return x.astype(np.float32), y.astype(np.float32)
+
+
+def _shard_paths(data_dir, shard):
+    base = os.path.join(data_dir, f"shard_{shard:05d}")
+    return base + "_x.npy", base + "_y.npy", base + ".json"
+
+
+def _shard_meta(shard, shard_size, T, seed):
+    # everything the shard's contents depend on; a cached shard is reused
+    # only if its sidecar matches exactly
+    return {"shard": shard, "seed": seed, "T": T, "shard_size": shard_size,
+            "sensor_noise": SENSOR_NOISE, "width": WIDTH, "height": HEIGHT,
+            "num_beacons": NUM_BEACONS}
+
+
+def _generate_shard(job):
+    data_dir, shard, shard_size, T, seed, seed_seq = job
+    x_path, y_path, meta_path = _shard_paths(data_dir, shard)
+    meta = _shard_meta(shard, shard_size, T, seed)
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            if json.load(f) == meta:
+                return shard
+        print(f"  shard {shard}: cached settings differ, regenerating")
+        os.remove(meta_path)
+    sim = BatchSim(shard_size, WIDTH, HEIGHT, NUM_BEACONS, seed=seed_seq)
+    x, y = _features(*sim.rollout(T, SENSOR_NOISE))
+    # the sidecar is written last: a shard only counts as cached once it exists
+    np.save(x_path, x)
+    np.save(y_path, y)
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+    return shard
+
+
+def generate_shards(data_dir=DATA_DIR, n_episodes=200, T=400, shard_size=50, seed=0, workers=None):
+    """Write n_episodes trajectories as ceil(n_episodes / shard_size) shards.
+
+    Each shard is one BatchSim rollout, generated in a worker process from its
+    own SeedSequence(seed).spawn() stream, so shards of different seeds never
+    share random streams. Shards already on disk whose JSON sidecar matches
+    (seed, T, shard_size, sensor noise, world) are skipped. Returns the shard
+    paths as (x_path, y_path) pairs.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    n_shards = -(-n_episodes // shard_size)
+    seed_seqs = np.random.SeedSequence(seed).spawn(n_shards)
+    jobs = [(data_dir, shard, shard_size, T, seed, seed_seqs[shard]) for shard in range(n_shards)]
+    workers = os.cpu_count() if workers is None else workers
+    if workers <= 1:
+        done = [_generate_shard(job) for job in jobs]
+    else:
+        with Pool(min(workers, n_shards)) as pool:
+            done = pool.map(_generate_shard, jobs)
+    return [_shard_paths(data_dir, shard)[:2] for shard in sorted(done)]
+
+
+class ShardDataset(IterableDataset):
+    """Streams mini-batches of consecutive seq_len-step windows from memory-mapped shards.
+
+    Each shard's trajectories are shuffled and split into groups of
+    batch_size, and every group is yielded window by window in time order,
+    as (worker, t, x, y) with x, y of shape (group, <= seq_len, ...). The
+    training loop carries the LSTM state from one window of a group to the
+    next and resets it only at t == 0. NeuralFilter likewise starts from
+    zero state only at the start of a trajectory, so no window starts from
+    a zero state mid-trajectory. Batches from different DataLoader workers
+    interleave, so the state is kept per worker.
+
+    Shards are visited in a fresh random order every epoch, so only one
+    shard's pages are hot per worker at a time. The order is drawn from
+    (seed, epoch) alone and then dealt out to DataLoader workers, so every
+    shard is seen exactly once per epoch. Workers hold a pickled copy of the
+    dataset, so set_epoch only reaches them if the DataLoader starts fresh
+    workers every epoch (no persistent_workers).
+    """
+
+    def __init__(self, shard_paths, seq_len=100, batch_size=32, seed=0):
+        self.shard_paths = shard_paths
+        self.seq_len = seq_len
+        self.batch_size = batch_size
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __iter__(self):
+        info = get_worker_info()
+        worker, n_workers = (info.id, info.num_workers) if info is not None else (0, 1)
+        order = np.random.default_rng((self.seed, self.epoch)).permutation(len(self.shard_paths))
+        rng = np.random.default_rng((self.seed, self.epoch, worker))   # trajectory order only
+        for i in order[worker::n_workers]:
+            x_path, y_path = self.shard_paths[i]
+            x = np.load(x_path, mmap_mode="r")
+            y = np.load(y_path, mmap_mode="r")
+            B, T = y.shape[:2]
+            trajectories = rng.permutation(B)
+            for g in range(0, B, self.batch_size):
+                # sorted so the memory-mapped reads go forward through the file
+                group = np.sort(trajectories[g:g + self.batch_size])
+                for t in range(0, T, self.seq_len):
+                    yield (worker, t,
+                           torch.from_numpy(np.array(x[group, t:t + self.seq_len])),
+                           torch.from_numpy(np.array(y[group, t:t + self.seq_len])))
 
 
 # ---------------------------------------------------------------------------
 # Training
 # ---------------------------------------------------------------------------
 
-def train(n_episodes: int = 200, T: int = 400, epochs: int = 150):
-    print(f"Generating {n_episodes} trajectories × {T} steps...")
-    all_obs, all_ctrl, all_pos = [], [], []
-    for i in range(n_episodes):
-        if (i + 1) % 50 == 0:
-            print(f"  {i + 1}/{n_episodes}")
-        obs, ctrl, pos = collect_trajectory(T=T, seed=i)
-        all_obs.append(obs)
-        all_ctrl.append(ctrl)
-        all_pos.append(pos)
-
-    # tensors: (N, T, ?)
-    obs_t  = torch.tensor(np.array(all_obs),  dtype=torch.float32)
-    ctrl_t = torch.tensor(np.array(all_ctrl), dtype=torch.float32)
-    pos_t  = torch.tensor(np.array(all_pos),  dtype=torch.float32)
-
-    # normalize
-    obs_t          = obs_t  / RANGE_SCALE
-    ctrl_t[..., 0] = ctrl_t[..., 0] / MU_SCALE
-    ctrl_t[..., 1] = ctrl_t[..., 1] / MU_SCALE
-    ctrl_t[..., 2] = ctrl_t[..., 2] / DT_SCALE   # all 1.0 (fixed DT)
-    pos_t[..., 0]  = pos_t[..., 0]  / WIDTH
-    pos_t[..., 1]  = pos_t[..., 1]  / HEIGHT
-
-    x_in = torch.cat([obs_t, ctrl_t], dim=-1)   # (N, T, 4)
+def train(n_episodes: int = 200, T: int = 400, epochs: int = 150, data_dir: str = DATA_DIR,
+          shard_size: int = 50, seq_len: int = 200, batch_size: int = 32,
+          workers: int = None, loader_workers: int = 2, seed: int = 0):
+    print(f"Generating {n_episodes} trajectories × {T} steps into {data_dir}...")
+    shard_paths = generate_shards(data_dir, n_episodes, T, shard_size, seed, workers)
+
+    dataset = ShardDataset(shard_paths, seq_len=seq_len, batch_size=batch_size, seed=seed)
+    # the dataset yields whole batches; workers are restarted every epoch so
+    # they pick up set_epoch
+    loader  = DataLoader(dataset, batch_size=None, num_workers=loader_workers)
+    steps_per_epoch = len(shard_paths) * -(-shard_size // batch_size) * -(-T // seq_len)
 
     model     = _LSTMFilter()
     optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
-    scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=epochs)
+    scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=epochs * steps_per_epoch)
 
-    WARMUP = 15   # skip first steps while hidden state initialises
+    WARMUP = 15   # skip first steps of each trajectory while hidden state initialises
 
-    print(f"Training LSTM for {epochs} epochs...")
+    print(f"Training LSTM for {epochs} epochs ({seq_len}-step windows, batch {batch_size})...")
     for epoch in range(epochs):
         model.train()
-        optimizer.zero_grad()
-
-        params, _ = model(x_in)                       # (N, T, 4)
-        mean    = params[..., :2]                     # (N, T, 2)
-        log_std = params[..., 2:].clamp(-4, 2)
-        std     = torch.exp(log_std)
-
-        nll = (0.5 * ((pos_t[:, WARMUP:] - mean[:, WARMUP:]) / std[:, WARMUP:]) ** 2
-               + log_std[:, WARMUP:]).mean()
+        dataset.set_epoch(epoch)
+        total_nll, sq_err, n_batches, n_points = 0.0, torch.zeros(2), 0, 0
+
+        hidden = {}                                   # per loader worker, carried across windows
+        for worker, t, x_in, pos_t in loader:         # (B, <= seq_len, 4), (B, <= seq_len, 2)
+            optimizer.zero_grad()
+
+            # truncated BPTT: continue from the previous window's state, zero at t == 0
+            state = hidden.get(worker) if t > 0 else None
+            params, (h, c) = model(x_in, state)       # (B, seq_len, 4)
+            hidden[worker] = (h.detach(), c.detach())
+            skip = WARMUP if t == 0 else 0
+            mean    = params[:, skip:, :2]
+            log_std = params[:, skip:, 2:].clamp(-4, 2)
+            std     = torch.exp(log_std)
+            target  = pos_t[:, skip:]
+
+            nll = (0.5 * ((target - mean) / std) ** 2 + log_std).mean()
+
+            nll.backward()
+            nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+            optimizer.step()
+            scheduler.step()
 
-        nll.backward()
-        nn.utils.clip_grad_norm_(model.parameters(), 1.0)
-        optimizer.step()
-        scheduler.step()
-
-        if (epoch + 1) % 30 == 0:
             with torch.no_grad():
-                rmse_x = (((pos_t[:, WARMUP:, 0] - mean[:, WARMUP:, 0]) * WIDTH)  ** 2).mean().sqrt()
-                rmse_y = (((pos_t[:, WARMUP:, 1] - mean[:, WARMUP:, 1]) * HEIGHT) ** 2).mean().sqrt()
-            print(f"  epoch {epoch+1:3d}/{epochs}  NLL={nll.item():.4f}  "
+                err = (target - mean) * torch.tensor([WIDTH, HEIGHT])
+                sq_err += (err ** 2).sum(dim=(0, 1))
+                n_points += err.shape[0] * err.shape[1]
+            total_nll += nll.item()
+            n_batches += 1
+
+        if (epoch + 1) % 5 == 0 or epoch == 0:
+            rmse_x, rmse_y = (sq_err / max(n_points, 1)).sqrt().tolist()
+            print(f"  epoch {epoch+1:3d}/{epochs}  NLL={total_nll / max(n_batches, 1):.4f}  "
                   f"RMSE x={rmse_x:.1f}px  y={rmse_y:.1f}px")
 
     torch.save(model.state_dict(), WEIGHTS_PATH)
     print(f"\nWeights saved to {WEIGHTS_PATH}")
+    export_variants(model)
+
+
+# ---------------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------------
+
+def export_variants(model):
+    """Write the TorchScript, dynamic-int8 and ONNX variants NeuralFilter can load."""
+    model = model.eval()
+    step  = _StepModel(model).eval()
+    x = torch.zeros(1, 1, INPUT_SIZE)
+    h = torch.zeros(NUM_LAYERS, 1, HIDDEN_SIZE)
+    c = torch.zeros(NUM_LAYERS, 1, HIDDEN_SIZE)
+
+    with torch.no_grad():
+        scripted = torch.jit.freeze(torch.jit.trace(step, (x, h, c)))
+        torch.jit.save(scripted, SCRIPTED_PATH)
+
+        # int8 weights, activations quantized on the fly; LSTM and Linear only
+        quantized = torch.ao.quantization.quantize_dynamic(
+            model, {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+        torch.jit.save(torch.jit.trace(_StepModel(quantized).eval(), (x, h, c)), QUANTIZED_PATH)
+
+        # batch and time are dynamic, so one file serves per-step, batched
+        # and whole-sequence inference
+        torch.onnx.export(
+            step, (x, h, c), ONNX_PATH, dynamo=False,
+            input_names=["x", "h", "c"], output_names=["params", "h_out", "c_out"],
+            dynamic_axes={"x": {0: "batch", 1: "time"}, "h": {1: "batch"}, "c": {1: "batch"},
+                          "params": {0: "batch", 1: "time"},
+                          "h_out": {1: "batch"}, "c_out": {1: "batch"}},
+        )
+
+    for path in (SCRIPTED_PATH, QUANTIZED_PATH, ONNX_PATH):
+        print(f"Exported {path} ({os.path.getsize(path) / 1024:.0f} KiB)")
 
 
 if __name__ == "__main__":
-    train()
+    parser = argparse.ArgumentParser(description="Train the LSTM neural filter")
+    parser.add_argument("--episodes", type=int, default=200)
+    parser.add_argument("--steps", type=int, default=400, help="steps per trajectory")
+    parser.add_argument("--epochs", type=int, default=150)
+    parser.add_argument("--data-dir", default=DATA_DIR, help="shard cache directory")
+    parser.add_argument("--shard-size", type=int, default=50, help="trajectories per shard")
+    parser.add_argument("--seq-len", type=int, default=200, help="truncated window length")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="data generation processes (default: all cores)")
+    parser.add_argument("--loader-workers", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--export-only", action="store_true",
+                        help="skip training; export the saved weights to every variant")
+    args = parser.parse_args()
+    if args.export_only:
+        model = _LSTMFilter()
+        model.load_state_dict(torch.load(WEIGHTS_PATH, map_location="cpu", weights_only=True))
+        export_variants(model)
+        sys.exit()
+    train(args.episodes, args.steps, args.epochs, args.data_dir, args.shard_size, args.seq_len,
+          args.batch_size, args.workers, args.loader_workers, args.seed)